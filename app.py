@@ -1,6 +1,8 @@
 # Import necessary modules and classes
 
-from server import app
+from server import create_app
+
+app = create_app()
 
 # Entry point of the application
 if __name__ == "__main__":
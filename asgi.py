@@ -0,0 +1,7 @@
+# ASGI entry point: uvicorn asgi:application
+
+from server import create_app
+from server.asgi import AsgiApp
+
+# The async routes over aiosqlite, everything else on the Flask app
+application = AsgiApp(create_app())
@@ -0,0 +1,123 @@
+"""NumPy price analytics against the equivalent SQL GROUP BY queries.
+
+Generates a catalog with server.generator, then times:
+
+- the initial load of the price columns and an incremental refresh after
+  appending rows (the path /analytics/prices takes on each request);
+- per-restaurant and per-pizza count/min/max/avg with NumPy and with an
+  SQLite GROUP BY over restaurant_pizzas;
+- the whole-table summary (percentiles and a histogram) with NumPy, and the
+  same percentiles in SQL via ORDER BY price LIMIT 1 OFFSET n per percentile.
+
+    python benchmarks/analytics.py --rows 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Must be set before the server package is imported
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(_db_dir, 'benchmark.db')}"
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from server import create_app, db  # noqa: E402
+from server.analytics import DEFAULT_PERCENTILES, PriceColumns, group_stats, summarize  # noqa: E402
+from server.generator import generate_catalog  # noqa: E402
+from server.models import Pizza, RestaurantPizza  # noqa: E402
+
+app = create_app()
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def sql_group_by(column):
+    return db.session.execute(
+        select(
+            column,
+            func.count(),
+            func.min(RestaurantPizza.price),
+            func.max(RestaurantPizza.price),
+            func.avg(RestaurantPizza.price),
+        ).group_by(column)
+    ).all()
+
+
+def sql_percentiles(count):
+    # Each percentile is one seek into ix_restaurant_pizzas_price
+    return [
+        db.session.execute(
+            select(RestaurantPizza.price)
+            .order_by(RestaurantPizza.price)
+            .limit(1)
+            .offset(min(count - 1, round(p / 100 * (count - 1))))
+        ).scalar()
+        for p in DEFAULT_PERCENTILES
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="restaurant_pizzas rows")
+    parser.add_argument("--append", type=int, default=1_000, help="rows appended before the incremental refresh")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        restaurants = max(10, args.rows // 100)
+        generate_catalog(restaurants=restaurants, pizzas=max(500, restaurants // 2), menu_mean=100)
+        db.session.execute(insert(Pizza).values(name="Appended Pizza", ingredients="Dough"))
+        appended_pizza = db.session.execute(select(func.max(Pizza.id))).scalar()
+        db.session.commit()
+
+        columns = PriceColumns()
+        start = time.perf_counter()
+        data = columns.refresh()
+        load_ms = (time.perf_counter() - start) * 1000
+        count = len(data["price"])
+
+        # Inserts only, so the refresh reads just the new rows
+        db.session.execute(
+            insert(RestaurantPizza),
+            [{"restaurant_id": r, "pizza_id": appended_pizza, "price": 10} for r in range(1, args.append + 1)],
+        )
+        db.session.commit()
+        start = time.perf_counter()
+        data = columns.refresh()
+        refresh_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{count} rows")
+        print(f"  {'initial load':<36}{load_ms:>12.2f} ms")
+        print(f"  {f'refresh after {args.append} appends':<36}{refresh_ms:>12.2f} ms")
+        print(f"  {'memory':<36}{sum(a.nbytes for a in data.values()) / 2**20:>12.2f} MiB")
+
+        print(f"{'':<38}{'numpy ms':>12}{'sql ms':>12}")
+        for name, key, column in [
+            ("group by restaurant", "restaurant_id", RestaurantPizza.restaurant_id),
+            ("group by pizza", "pizza_id", RestaurantPizza.pizza_id),
+        ]:
+            vectorized = median_ms(lambda: group_stats(data[key], data["price"]), args.repeat)
+            sql = median_ms(lambda: sql_group_by(column), args.repeat)
+            print(f"  {name:<36}{vectorized:>12.2f}{sql:>12.2f}")
+
+        vectorized = median_ms(lambda: summarize(data["price"], DEFAULT_PERCENTILES, 10), args.repeat)
+        sql = median_ms(lambda: sql_percentiles(len(data["price"])), args.repeat)
+        print(f"  {'percentiles + histogram':<36}{vectorized:>12.2f}{sql:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Throughput and latency of the WSGI and ASGI entry points under many connections.
+
+Builds one synthetic database (see sqlite_profile.py), then serves it with
+gunicorn's threaded worker (app:app) and with uvicorn (asgi:application)
+in turn. Each server is driven by --connections concurrent keep-alive
+connections, opened from one asyncio client, for a fixed time.
+The reads go to /restaurants/<id>, /pizzas?limit=50 and
+/restaurantspizza?limit=50. With --slow-clients, that many extra connections
+trickle their requests in one byte at a time, the way clients on a bad
+network do. Results are requests/second and p50/p99 latency, printed as JSON.
+The response cache is turned off so every read reaches SQLite.
+
+    python benchmarks/concurrency.py --connections 1000 --slow-clients 50 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlite_profile import ROOT, build_database, wait_until_up
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))] if ordered else None
+
+
+def request_bytes(path):
+    return f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode()
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split(b" ", 2)[1])
+    length, close = 0, False
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection" and value.strip().lower() == "close":
+            close = True
+    await reader.readexactly(length)
+    return status, close
+
+
+async def client(port, args, rng, deadline, stats):
+    # One keep-alive connection sending requests back to back until the deadline
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            roll = rng.random()
+            if roll < 0.5:
+                path = f"/restaurants/{rng.randint(1, args.restaurants)}"
+            elif roll < 0.75:
+                path = "/pizzas?limit=50"
+            else:
+                path = "/restaurantspizza?limit=50"
+
+            start = time.perf_counter()
+            writer.write(request_bytes(path))
+            status, close = await read_response(reader)
+            stats["latencies"].append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                stats["errors"] += 1
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            stats["errors"] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def slow_client(port, args, deadline):
+    # Sends its request a byte at a time, spread over --slow-seconds
+    data = request_bytes("/")
+    delay = args.slow_seconds / len(data)
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            while time.monotonic() < deadline:
+                for i in range(len(data)):
+                    writer.write(data[i : i + 1])
+                    await asyncio.sleep(delay)
+                await read_response(reader)
+            writer.close()
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            await asyncio.sleep(0.01)
+
+
+async def drive(port, args):
+    stats = {"latencies": [], "errors": 0}
+    deadline = time.monotonic() + args.duration
+    rng = random.Random(0)
+    tasks = [asyncio.create_task(slow_client(port, args, deadline)) for _ in range(args.slow_clients)]
+    tasks += [
+        asyncio.create_task(client(port, args, random.Random(rng.random()), deadline, stats))
+        for _ in range(args.connections)
+    ]
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def run_server(name, command, source, tmp, args, port):
+    path = os.path.join(tmp, f"{name}.db")
+    shutil.copy(source, path)
+    env = dict(os.environ, DATABASE_URI=f"sqlite:///{path}", RESPONSE_CACHE="0")
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        wait_until_up(f"http://127.0.0.1:{port}")
+        stats = asyncio.run(drive(port, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = stats["latencies"]
+    return {
+        "requests_per_second": round(len(latencies) / args.duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+        "errors": stats["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=2_000)
+    parser.add_argument("--pizzas", type=int, default=500)
+    parser.add_argument("--menu-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="processes per server")
+    parser.add_argument("--threads", type=int, default=16, help="gunicorn threads per worker")
+    parser.add_argument("--connections", type=int, default=1_000)
+    parser.add_argument("--slow-clients", type=int, default=0)
+    parser.add_argument("--slow-seconds", type=float, default=2.0, help="time a slow client takes to send one request")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8775)
+    args = parser.parse_args()
+
+    wsgi = [
+        sys.executable, "-m", "gunicorn",
+        "--worker-class", "gthread",
+        "--workers", str(args.workers),
+        "--threads", str(args.threads),
+        "--worker-connections", str(args.connections + args.slow_clients + 100),
+        "--backlog", "4096",
+        "--bind", f"127.0.0.1:{args.port}",
+        "--log-level", "warning",
+        "app:app",
+    ]
+    asgi = [
+        sys.executable, "-m", "uvicorn",
+        "--workers", str(args.workers),
+        "--port", str(args.port + 1),
+        "--backlog", "4096",
+        "--log-level", "warning",
+        "--no-access-log",
+        "asgi:application",
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.db")
+        build_database(source, args.restaurants, args.pizzas, args.menu_size)
+
+        report = {
+            "wsgi (gunicorn gthread)": run_server("wsgi", wsgi, source, tmp, args, args.port),
+            "asgi (uvicorn)": run_server("asgi", asgi, source, tmp, args, args.port + 1),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
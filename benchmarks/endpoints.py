@@ -0,0 +1,226 @@
+"""Latency, query count and peak memory of every route over synthetic catalogs.
+
+For each scale (number of restaurant_pizzas rows) a reproducible catalog is
+generated with server.generator (the `flask seed` data generator, built on
+Faker) into a throwaway SQLite database. Every route in
+server/routes.py is then driven through the Flask test client, and a JSON
+report is written with p50/p95/p99 latency, SQL statements per request and
+peak Python memory per endpoint.
+
+    python benchmarks/endpoints.py --scales 10000,100000,1000000 --output report.json
+
+The response cache is disabled so every request does the full work.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Must be set before the server package is imported
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(_db_dir, 'benchmark.db')}"
+os.environ["RESPONSE_CACHE"] = "0"
+
+from sqlalchemy import event, insert  # noqa: E402
+
+from server import create_app, db  # noqa: E402
+from server.generator import generate_catalog  # noqa: E402
+from server.models import Pizza, Restaurant, sync_ingredients  # noqa: E402
+
+app = create_app()
+
+# Pizzas kept off every generated menu for the write endpoints to use
+SPARE_PIZZAS = 100
+
+
+def build_catalog(rows, seed):
+    """Generate a catalog of about ``rows`` menu entries, ~100 per restaurant."""
+    restaurants = max(10, rows // 100)
+    pizzas = max(restaurants // 2, 500)
+
+    db.drop_all()
+    db.create_all()
+
+    counts = generate_catalog(
+        restaurants=restaurants,
+        pizzas=pizzas,
+        menu_mean=min(rows // restaurants, pizzas // 2),
+        seed=seed,
+    )
+    spare = db.session.execute(
+        insert(Pizza).returning(Pizza.id, Pizza.ingredients),
+        [
+            {"name": f"Spare Pizza {i}", "ingredients": "Dough, Tomato Sauce, Cheese"}
+            for i in range(1, SPARE_PIZZAS + 1)
+        ],
+    )
+    sync_ingredients(db.session.connection(), spare.all())
+    db.session.commit()
+    counts["pizzas"] += SPARE_PIZZAS
+
+    return counts
+
+
+def scenarios(catalog, rng, write_state):
+    """(name, request factory, requests to send) for every route.
+
+    Each factory returns the arguments for one test-client call, so the
+    requests vary (random ids) but the sequence is reproducible.
+    """
+    restaurants, pizzas = catalog["restaurants"], catalog["pizzas"]
+
+    def new_menu_entry():
+        # Spare pizzas are on no menu, so walking (restaurant, spare pizza)
+        # pairs gives every write a pair that doesn't exist yet
+        n = write_state["n"]
+        write_state["n"] += 1
+        return {
+            "price": rng.randint(1, 30),
+            "pizza_name": f"Spare Pizza {n // restaurants % SPARE_PIZZAS + 1}",
+            "restaurant_name": write_state["restaurant_names"][n % restaurants],
+        }
+
+    def delete_target(kind, upper):
+        write_state[kind] -= 1
+        return write_state[kind] if write_state[kind] >= 1 else upper
+
+    heavy = 3
+    return [
+        ("GET /", lambda: ("get", "/", {}), None),
+        ("GET /restaurants", lambda: ("get", "/restaurants", {}), None),
+        ("GET /restaurants?limit=50", lambda: ("get", "/restaurants?limit=50", {}), None),
+        ("GET /restaurants/<id>", lambda: ("get", f"/restaurants/{rng.randint(1, restaurants)}", {}), None),
+        ("GET /pizzas", lambda: ("get", "/pizzas", {}), None),
+        ("GET /pizzas?limit=50", lambda: ("get", "/pizzas?limit=50", {}), None),
+        (
+            "GET /pizzas?ingredients=cheese,mushrooms&exclude=ham",
+            lambda: ("get", "/pizzas?ingredients=cheese,mushrooms&exclude=ham&limit=50", {}),
+            None,
+        ),
+        ("GET /pizzas/<id>", lambda: ("get", f"/pizzas/{rng.randint(1, pizzas)}", {}), None),
+        ("GET /restaurantspizza", lambda: ("get", "/restaurantspizza", {}), None),
+        ("GET /restaurantspizza?limit=500", lambda: ("get", "/restaurantspizza?limit=500", {}), None),
+        ("GET /restaurantspizza?stream=true", lambda: ("get", "/restaurantspizza?stream=true", {}), heavy),
+        ("GET /export/restaurantspizza.ndjson", lambda: ("get", "/export/restaurantspizza.ndjson", {}), heavy),
+        ("GET /export/restaurantspizza.csv", lambda: ("get", "/export/restaurantspizza.csv", {}), heavy),
+        ("POST /restaurantspizza", lambda: ("post", "/restaurantspizza", {"data": new_menu_entry()}), None),
+        (
+            "POST /restaurantspizza/bulk",
+            lambda: ("post", "/restaurantspizza/bulk", {"json": [new_menu_entry() for _ in range(100)]}),
+            None,
+        ),
+        ("DELETE /restaurants/<id>", lambda: ("delete", f"/restaurants/{delete_target('restaurant', restaurants)}", {}), None),
+        ("DELETE /pizzas/<id>", lambda: ("delete", f"/pizzas/{delete_target('pizza', pizzas)}", {}), None),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def measure(client, factory, count, statements):
+    latencies, queries, statuses = [], [], {}
+    for _ in range(count):
+        method, url, kwargs = factory()
+        statements[0] = 0
+        start = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        response.get_data()
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(statements[0])
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    # One more request under tracemalloc for the peak allocation
+    method, url, kwargs = factory()
+    tracemalloc.start()
+    getattr(client, method)(url, **kwargs).get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "requests": count,
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries_per_request": round(statistics.fmean(queries), 2),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def run_scale(rows, args):
+    with app.app_context():
+        start = time.perf_counter()
+        catalog = build_catalog(rows, args.seed)
+        build_seconds = time.perf_counter() - start
+
+        write_state = {
+            "n": 0,
+            "restaurant": catalog["restaurants"] + 1,
+            "pizza": catalog["pizzas"] + 1,
+            "restaurant_names": [name for (name,) in db.session.query(Restaurant.name).order_by(Restaurant.id)],
+        }
+        engine = db.engine
+
+    statements = [0]
+
+    def count_statement(*_):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    client = app.test_client()
+    rng = random.Random(args.seed)
+    endpoints = {}
+    try:
+        for name, factory, count in scenarios(catalog, rng, write_state):
+            requests = min(count or args.requests, args.requests)
+            endpoints[name] = measure(client, factory, requests, statements)
+            print(f"  {name:<40} p50 {endpoints[name]['p50_ms']:>10.3f} ms", file=sys.stderr)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    return {"catalog": catalog, "build_seconds": round(build_seconds, 2), "endpoints": endpoints}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="10000,100000,1000000", help="comma separated restaurant_pizzas row counts")
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="benchmark-report.json")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "requests_per_endpoint": args.requests,
+        },
+        "scales": {},
+    }
+    for rows in (int(scale) for scale in args.scales.split(",")):
+        print(f"scale {rows}", file=sys.stderr)
+        report["scales"][str(rows)] = run_scale(rows, args)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Before/after latency of restaurant_pizzas lookups and deletes with the
+c4ace1d29b03 indexes.
+
+Builds two throwaway SQLite databases with the same N association rows, one
+with the original schema and one with the indexes, then times the menu lookup,
+the price lookup and the deletes done by RestaurantByID/PizzaByID.
+
+    python benchmarks/restaurant_pizza_indexes.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+SCHEMA = """
+CREATE TABLE "Restaurant" (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL UNIQUE, address VARCHAR NOT NULL);
+CREATE TABLE "Pizza" (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL UNIQUE, ingredients VARCHAR NOT NULL);
+CREATE TABLE restaurant_pizzas (
+    id INTEGER PRIMARY KEY,
+    price NUMERIC(10, 2) NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    updated_at DATETIME,
+    restaurant_id INTEGER NOT NULL REFERENCES "Restaurant" (id),
+    pizza_id INTEGER NOT NULL REFERENCES "Pizza" (id)
+);
+"""
+
+INDEXES = """
+CREATE UNIQUE INDEX ix_restaurant_pizzas_restaurant_id_pizza_id ON restaurant_pizzas (restaurant_id, pizza_id);
+CREATE INDEX ix_restaurant_pizzas_pizza_id_price ON restaurant_pizzas (pizza_id, price);
+"""
+
+QUERIES = {
+    "menu lookup": "SELECT id, pizza_id, price FROM restaurant_pizzas WHERE restaurant_id = ?",
+    "price lookup": "SELECT restaurant_id, price FROM restaurant_pizzas WHERE pizza_id = ? ORDER BY price LIMIT 10",
+}
+
+DELETES = {
+    "delete by restaurant": "DELETE FROM restaurant_pizzas WHERE restaurant_id = ?",
+    "delete by pizza": "DELETE FROM restaurant_pizzas WHERE pizza_id = ?",
+}
+
+
+def build(path, rows, restaurants, pizzas, indexed):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        'INSERT INTO "Restaurant" (id, name, address) VALUES (?, ?, ?)',
+        ((i, f"Restaurant {i}", f"{i} Main St") for i in range(1, restaurants + 1)),
+    )
+    conn.executemany(
+        'INSERT INTO "Pizza" (id, name, ingredients) VALUES (?, ?, ?)',
+        ((i, f"Pizza {i}", "Dough, Cheese") for i in range(1, pizzas + 1)),
+    )
+
+    # Every restaurant serves rows // restaurants distinct pizzas
+    per_restaurant = rows // restaurants
+    rng = random.Random(0)
+
+    def association_rows():
+        for restaurant_id in range(1, restaurants + 1):
+            for pizza_id in rng.sample(range(1, pizzas + 1), per_restaurant):
+                yield restaurant_id, pizza_id, rng.randint(1, 30)
+
+    conn.executemany(
+        "INSERT INTO restaurant_pizzas (restaurant_id, pizza_id, price) VALUES (?, ?, ?)",
+        association_rows(),
+    )
+    if indexed:
+        conn.executescript(INDEXES)
+    conn.commit()
+    return conn
+
+
+def time_ms(conn, sql, params):
+    start = time.perf_counter()
+    conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) * 1000
+
+
+def run(conn, restaurants, pizzas, samples):
+    rng = random.Random(1)
+    results = {}
+    for name, sql in QUERIES.items():
+        upper = restaurants if "restaurant_id" in sql else pizzas
+        timings = [time_ms(conn, sql, (rng.randint(1, upper),)) for _ in range(samples)]
+        results[name] = statistics.median(timings)
+
+    for name, sql in DELETES.items():
+        upper = restaurants if "restaurant_id" in sql else pizzas
+        timings = []
+        for _ in range(samples):
+            timings.append(time_ms(conn, sql, (rng.randint(1, upper),)))
+            # Roll back so every sample deletes from the full table
+            conn.rollback()
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--restaurants", type=int, default=10_000)
+    parser.add_argument("--pizzas", type=int, default=5_000)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for indexed in (False, True):
+            path = os.path.join(tmp, f"indexed-{indexed}.db")
+            conn = build(path, args.rows, args.restaurants, args.pizzas, indexed)
+            results[indexed] = run(conn, args.restaurants, args.pizzas, args.samples)
+            conn.close()
+
+    print(f"{args.rows} restaurant_pizzas rows, median of {args.samples} samples (ms)")
+    print(f"{'operation':<22}{'no index':>12}{'indexed':>12}")
+    for name in results[False]:
+        print(f"{name:<22}{results[False][name]:>12.3f}{results[True][name]:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
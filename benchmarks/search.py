@@ -0,0 +1,70 @@
+"""Latency of GET /pizzas/search against a LIKE scan over the same pizzas.
+
+Generates a catalog of --pizzas pizzas with server.generator, then times
+each query term through the Flask test client (FTS5, ranked, first page) and
+as a `LIKE '%term%'` scan collecting every match over name and ingredients,
+which is what ranking without the index would have to start from. The terms
+run from one pizza's name to prefixes matching most of the catalog.
+
+    python benchmarks/search.py --pizzas 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Must be set before the server package is imported
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(_db_dir, 'benchmark.db')}"
+os.environ["RESPONSE_CACHE"] = "0"
+
+from sqlalchemy import text  # noqa: E402
+
+from server import create_app, db  # noqa: E402
+from server.generator import generate_catalog  # noqa: E402
+
+app = create_app()
+
+TERMS = ["mushrooms", "mush", "anchovies feta", "pineapple ham", "ba"]
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pizzas", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        generate_catalog(restaurants=10, pizzas=args.pizzas, menu_mean=5)
+
+        client = app.test_client()
+        like = text('SELECT id FROM "Pizza" WHERE name LIKE :pattern OR ingredients LIKE :pattern')
+        # A single pizza's name, the most selective kind of query
+        name = db.session.execute(text('SELECT name FROM "Pizza" WHERE id = :id'), {"id": args.pizzas // 2}).scalar()
+
+        print(f"{'query':<20}{'fts5 ms':>12}{'like ms':>12}")
+        for term in [name, *TERMS]:
+            fts = median_ms(lambda: client.get(f"/pizzas/search?q={term}&limit=50").get_data(), args.repeat)
+            # LIKE has no AND of words; the first word gives it the easier job
+            pattern = f"%{term.split()[0]}%"
+            scan = median_ms(lambda: db.session.execute(like, {"pattern": pattern}).all(), args.repeat)
+            print(f"{term:<20}{fts:>12.2f}{scan:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Rows/second of the marshmallow and compiled serializer paths.
+
+Loads the same rows both ways: ORM objects dumped with schema.dump(many=True),
+and Core column tuples dumped with the generated function from
+server.serializers. It times the dump alone and the full load + dump + JSON
+encode, and checks that both paths produce byte-identical JSON.
+
+    python benchmarks/serializers.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Must be set before the server package is imported
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(_db_dir, 'benchmark.db')}"
+
+from server import create_app, db  # noqa: E402
+from server.generator import generate_catalog  # noqa: E402
+from server.models import Pizza, Restaurant, RestaurantPizza  # noqa: E402
+from server.schema import pizzas_schema, restaurantpizzas_schema, restaurants_schema  # noqa: E402
+from server.serializers import compile_dumper  # noqa: E402
+
+app = create_app()
+
+CASES = [
+    ("restaurants", Restaurant, restaurants_schema),
+    ("pizzas", Pizza, pizzas_schema),
+    ("restaurant_pizzas", RestaurantPizza, restaurantpizzas_schema),
+]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_case(model, schema):
+    columns = [getattr(model, field.attribute or key) for key, field in schema.dump_fields.items()]
+    dump = compile_dumper(schema)
+    encode = app.json.dumps
+
+    db.session.expunge_all()
+    objects, load_orm = timed(lambda: model.query.order_by(model.id).all())
+    marshmallow_data, dump_orm = timed(lambda: schema.dump(objects))
+    marshmallow_json, encode_orm = timed(lambda: encode(marshmallow_data))
+
+    rows, load_core = timed(lambda: model.query.with_entities(*columns).order_by(model.id).all())
+    compiled_data, dump_core = timed(lambda: [dump(row) for row in rows])
+    compiled_json, encode_core = timed(lambda: encode(compiled_data))
+
+    assert compiled_json == marshmallow_json, "compiled output differs from marshmallow"
+
+    count = len(rows)
+    return {
+        "rows": count,
+        "marshmallow dump rows/s": count / dump_orm,
+        "compiled dump rows/s": count / dump_core,
+        "marshmallow end-to-end rows/s": count / (load_orm + dump_orm + encode_orm),
+        "compiled end-to-end rows/s": count / (load_core + dump_core + encode_core),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="restaurant_pizzas rows")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        restaurants = max(10, args.rows // 20)
+        generate_catalog(restaurants=restaurants, pizzas=max(100, restaurants), menu_mean=20)
+
+        for name, model, schema in CASES:
+            results = run_case(model, schema)
+            print(f"{name} ({results.pop('rows')} rows)")
+            for label, value in results.items():
+                print(f"  {label:<32}{value:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
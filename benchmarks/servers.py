@@ -0,0 +1,120 @@
+"""Throughput of the Werkzeug dev server against gunicorn with gunicorn.conf.py.
+
+Builds one synthetic database (see sqlite_profile.py) and serves it three ways:
+the dev server as app.py runs it (debug on, without the reloader process),
+gunicorn with the production settings, and the same gunicorn without
+preload_app. Each is driven with the concurrency.py client for a fixed time.
+For the gunicorn runs it also reads every worker's memory from
+/proc/<pid>/smaps_rollup after the load. Private memory is what a worker
+copied or allocated itself, and PSS splits the shared pages between the
+processes sharing them.
+
+    python benchmarks/servers.py --connections 64 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from concurrency import drive, percentile
+from sqlite_profile import ROOT, build_database, wait_until_up
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces; the ppid follows its closing parenthesis
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return children
+
+
+def memory_kib(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def run_server(name, command, extra_env, source, tmp, args, port):
+    path = os.path.join(tmp, f"{name}.db")
+    shutil.copy(source, path)
+    env = dict(os.environ, DATABASE_URI=f"sqlite:///{path}", RESPONSE_CACHE="0", **extra_env)
+    # The dev server logs every request line to stderr
+    quiet = subprocess.DEVNULL if name == "dev" else None
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stderr=quiet)
+    try:
+        wait_until_up(f"http://127.0.0.1:{port}")
+        stats = asyncio.run(drive(port, args))
+        workers = [memory_kib(pid) for pid in child_pids(server.pid)] if "gunicorn" in command else []
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = stats["latencies"]
+    result = {
+        "requests_per_second": round(len(latencies) / args.duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+        "errors": stats["errors"],
+    }
+    if workers:
+        result["workers"] = len(workers)
+        for key in ("rss", "pss", "private"):
+            result[f"worker_{key}_mib"] = round(sum(w[key] for w in workers) / len(workers) / 1024, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=2_000)
+    parser.add_argument("--pizzas", type=int, default=500)
+    parser.add_argument("--menu-size", type=int, default=50)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8785)
+    args = parser.parse_args()
+    # concurrency.drive's other knobs
+    args.slow_clients, args.slow_seconds = 0, 0
+
+    dev = [
+        sys.executable, "-m", "flask", "--app", "app", "run",
+        "--debug", "--no-reload", "--port", str(args.port),
+    ]
+
+    def gunicorn(port):
+        return [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--log-level", "warning"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.db")
+        build_database(source, args.restaurants, args.pizzas, args.menu_size)
+
+        report = {
+            "dev server (app.py)": run_server("dev", dev, {}, source, tmp, args, args.port),
+            "gunicorn.conf.py": run_server("gunicorn", gunicorn(args.port + 1), {}, source, tmp, args, args.port + 1),
+            "gunicorn.conf.py, no preload": run_server(
+                "gunicorn-no-preload", gunicorn(args.port + 2), {"GUNICORN_PRELOAD": "0"}, source, tmp, args, args.port + 2
+            ),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Mixed read/write throughput under gunicorn with the SQLite tuning profile
+on and off.
+
+Builds one synthetic database, then for each mode starts gunicorn on a fresh
+copy of it (WAL mode is stored in the file, so the copies must not be shared),
+drives it with client threads for a fixed time and reports requests/second.
+Reads hit /restaurants/<id> and /pizzas pages; writes POST new menu entries.
+The response cache is turned off so every read reaches SQLite.
+
+    python benchmarks/sqlite_profile.py --workers 4 --threads 4 --duration 20
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_database(path, restaurants, pizzas, menu_size):
+    # Let the app create its own schema, then fill it with plain sqlite3
+    env = dict(os.environ, DATABASE_URI=f"sqlite:///{path}", SQLITE_TUNING="0")
+    subprocess.run(
+        [sys.executable, "-c", "from server import create_app, db\nwith create_app().app_context(): db.create_all()"],
+        cwd=ROOT,
+        env=env,
+        check=True,
+    )
+
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        'INSERT INTO "Restaurant" (id, name, address) VALUES (?, ?, ?)',
+        ((i, f"Restaurant {i}", f"{i} Main St") for i in range(1, restaurants + 1)),
+    )
+    conn.executemany(
+        'INSERT INTO "Pizza" (id, name, ingredients) VALUES (?, ?, ?)',
+        ((i, f"Pizza {i}", "Dough, Tomato Sauce, Cheese") for i in range(1, pizzas + 1)),
+    )
+    rng = random.Random(0)
+    conn.executemany(
+        "INSERT INTO restaurant_pizzas (restaurant_id, pizza_id, price) VALUES (?, ?, ?)",
+        (
+            (restaurant_id, pizza_id, rng.randint(1, 30))
+            for restaurant_id in range(1, restaurants + 1)
+            for pizza_id in rng.sample(range(1, pizzas + 1), menu_size)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base_url + "/", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def drive(base_url, args, seed, counter, results):
+    rng = random.Random(seed)
+    deadline = time.monotonic() + args.duration
+    reads = writes = errors = 0
+    while time.monotonic() < deadline:
+        try:
+            if rng.random() < args.write_ratio:
+                # Walk the (restaurant, pizza) pairs so writes rarely hit an
+                # existing menu entry; the ones that do come back as 409s
+                n = next(counter)
+                form = urllib.parse.urlencode({
+                    "price": rng.randint(1, 30),
+                    "pizza_name": f"Pizza {n % args.pizzas + 1}",
+                    "restaurant_name": f"Restaurant {n // args.pizzas % args.restaurants + 1}",
+                }).encode()
+                urllib.request.urlopen(base_url + "/restaurantspizza", data=form).read()
+                writes += 1
+            elif rng.random() < 0.5:
+                urllib.request.urlopen(f"{base_url}/restaurants/{rng.randint(1, args.restaurants)}").read()
+                reads += 1
+            else:
+                urllib.request.urlopen(f"{base_url}/pizzas?limit=50").read()
+                reads += 1
+        except urllib.error.HTTPError:
+            errors += 1
+    results.append((reads, writes, errors))
+
+
+def run_mode(tuned, source, tmp, args, port):
+    path = os.path.join(tmp, f"tuned-{tuned}.db")
+    shutil.copy(source, path)
+    env = dict(
+        os.environ,
+        DATABASE_URI=f"sqlite:///{path}",
+        SQLITE_TUNING="1" if tuned else "0",
+        RESPONSE_CACHE="0",
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn",
+            "--workers", str(args.workers),
+            "--threads", str(args.threads),
+            "--bind", f"127.0.0.1:{port}",
+            "--log-level", "warning",
+            "app:app",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(base_url)
+        # Shared pair counter; itertools.count is safe to advance from threads
+        counter = itertools.count()
+        results = []
+        threads = [
+            threading.Thread(
+                target=drive,
+                args=(base_url, args, seed, counter, results),
+            )
+            for seed in range(args.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    reads = sum(r for r, _, _ in results)
+    writes = sum(w for _, w, _ in results)
+    errors = sum(e for _, _, e in results)
+    return {
+        "reads_per_second": round(reads / args.duration, 1),
+        "writes_per_second": round(writes / args.duration, 1),
+        "requests_per_second": round((reads + writes) / args.duration, 1),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=2_000)
+    parser.add_argument("--pizzas", type=int, default=500)
+    parser.add_argument("--menu-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.db")
+        build_database(source, args.restaurants, args.pizzas, args.menu_size)
+
+        report = {}
+        for tuned in (False, True):
+            report["profile on" if tuned else "profile off"] = run_mode(
+                tuned, source, tmp, args, args.port + tuned
+            )
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
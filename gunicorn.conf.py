@@ -0,0 +1,58 @@
+"""gunicorn settings for production, picked up from the working directory:
+
+    gunicorn
+
+Every setting can be overridden on the command line or through the
+``GUNICORN_*`` environment variables below.
+"""
+import gc
+import os
+
+wsgi_app = "wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5555")
+
+# CPUs this process may run on (a container's limit, not the host's count)
+cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+# Serialization holds the GIL, so processes give the parallelism; the
+# threads of a worker overlap while one waits on SQLite or a client socket.
+# Past 8 threads a worker's requests mostly queue on its GIL and on SQLite's
+# single writer, and each thread can hold another pooled connection.
+workers = int(os.environ.get("GUNICORN_WORKERS", cpus * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", min(cpus * 2, 8)))
+worker_class = "gthread"
+
+# Import the app once in the master; workers share its pages copy-on-write
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+# Recycle workers now and then so slow leaks can't grow without bound
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10_000))
+max_requests_jitter = max_requests // 10
+
+# No collections while the app loads: a collection writes to the header of
+# every object it visits, which would make the workers copy those pages.
+# Whether the app is preloaded isn't final until gunicorn applies the command
+# line (--preload) after reading this file, and it is loaded before any hook
+# runs, so collections stay off in the master until when_ready either way.
+gc.disable()
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # The app's objects move to the permanent generation, which the
+        # workers' collections never scan (and so never write to)
+        gc.freeze()
+    gc.enable()
+
+
+def post_fork(server, worker):
+    # A pooled connection opened in the master must never be used by two
+    # processes. close=False drops the inherited pool without closing its
+    # connections, which still belong to the master.
+    if server.cfg.preload_app:
+        from server import db
+
+        # The app the master preloaded, which this worker inherited
+        with worker.app.wsgi().app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
@@ -0,0 +1,46 @@
+"""add table_versions change counters
+
+Revision ID: 30138d1533ec
+Revises: c4ace1d29b03
+Create Date: 2026-10-18 10:41:05.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '30138d1533ec'
+down_revision = 'c4ace1d29b03'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('Restaurant', 'Pizza', 'restaurant_pizzas')
+OPERATIONS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(table_versions, [{'table_name': name, 'version': 0} for name in VERSIONED_TABLES])
+
+    for table_name in VERSIONED_TABLES:
+        for operation in OPERATIONS:
+            op.execute(
+                f'CREATE TRIGGER "{table_name}_version_{operation.lower()}" '
+                f'AFTER {operation} ON "{table_name}" BEGIN '
+                f"INSERT INTO table_versions (table_name, version) VALUES ('{table_name}', 1) "
+                "ON CONFLICT (table_name) DO UPDATE SET version = version + 1; "
+                "END"
+            )
+
+
+def downgrade():
+    for table_name in VERSIONED_TABLES:
+        for operation in OPERATIONS:
+            op.execute(f'DROP TRIGGER IF EXISTS "{table_name}_version_{operation.lower()}"')
+
+    op.drop_table('table_versions')
@@ -0,0 +1,28 @@
+"""add restaurant_pizzas filter indexes
+
+Revision ID: 549fe2412253
+Revises: 30138d1533ec
+Create Date: 2026-10-18 14:02:31.570912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '549fe2412253'
+down_revision = '30138d1533ec'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_restaurant_pizzas_restaurant_id_price', 'restaurant_pizzas', ['restaurant_id', 'price'], unique=False)
+    op.create_index('ix_restaurant_pizzas_price', 'restaurant_pizzas', ['price'], unique=False)
+    op.create_index('ix_restaurant_pizzas_created_at', 'restaurant_pizzas', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_restaurant_pizzas_created_at', table_name='restaurant_pizzas')
+    op.drop_index('ix_restaurant_pizzas_price', table_name='restaurant_pizzas')
+    op.drop_index('ix_restaurant_pizzas_restaurant_id_price', table_name='restaurant_pizzas')
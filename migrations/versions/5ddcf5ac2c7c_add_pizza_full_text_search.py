@@ -0,0 +1,52 @@
+"""add pizza full-text search
+
+Revision ID: 5ddcf5ac2c7c
+Revises: 549fe2412253
+Create Date: 2026-10-18 15:27:09.118452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5ddcf5ac2c7c'
+down_revision = '549fe2412253'
+branch_labels = None
+depends_on = None
+
+TRIGGERS = ('pizza_fts_insert', 'pizza_fts_delete', 'pizza_fts_update')
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE pizza_fts USING fts5("
+        "name, ingredients, content='Pizza', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    op.execute("INSERT INTO pizza_fts (pizza_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+    op.execute(
+        'CREATE TRIGGER pizza_fts_insert AFTER INSERT ON "Pizza" BEGIN '
+        "INSERT INTO pizza_fts (rowid, name, ingredients) VALUES (new.id, new.name, new.ingredients); "
+        "END"
+    )
+    op.execute(
+        'CREATE TRIGGER pizza_fts_delete AFTER DELETE ON "Pizza" BEGIN '
+        "INSERT INTO pizza_fts (pizza_fts, rowid, name, ingredients) VALUES ('delete', old.id, old.name, old.ingredients); "
+        "END"
+    )
+    op.execute(
+        'CREATE TRIGGER pizza_fts_update AFTER UPDATE OF name, ingredients ON "Pizza" BEGIN '
+        "INSERT INTO pizza_fts (pizza_fts, rowid, name, ingredients) VALUES ('delete', old.id, old.name, old.ingredients); "
+        "INSERT INTO pizza_fts (rowid, name, ingredients) VALUES (new.id, new.name, new.ingredients); "
+        "END"
+    )
+    # Index the pizzas that already exist
+    op.execute("INSERT INTO pizza_fts (pizza_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    for trigger in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+
+    op.execute('DROP TABLE IF EXISTS pizza_fts')
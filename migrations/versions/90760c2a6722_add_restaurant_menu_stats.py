@@ -0,0 +1,73 @@
+"""add restaurant_menu_stats
+
+Revision ID: 90760c2a6722
+Revises: ac50106b5b8d
+Create Date: 2026-10-18 18:05:40.661023
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '90760c2a6722'
+down_revision = 'ac50106b5b8d'
+branch_labels = None
+depends_on = None
+
+ADD = (
+    "INSERT INTO restaurant_menu_stats (restaurant_id, pizza_count, price_total, price_min, price_max) "
+    "VALUES (new.restaurant_id, 1, new.price, new.price, new.price) "
+    "ON CONFLICT (restaurant_id) DO UPDATE SET "
+    "pizza_count = pizza_count + 1, "
+    "price_total = price_total + excluded.price_total, "
+    "price_min = min(price_min, excluded.price_min), "
+    "price_max = max(price_max, excluded.price_max); "
+)
+
+REMOVE = (
+    "UPDATE restaurant_menu_stats SET "
+    "pizza_count = pizza_count - 1, "
+    "price_total = price_total - old.price, "
+    "price_min = CASE WHEN old.price > price_min THEN price_min ELSE "
+    "(SELECT min(price) FROM restaurant_pizzas WHERE restaurant_id = old.restaurant_id) END, "
+    "price_max = CASE WHEN old.price < price_max THEN price_max ELSE "
+    "(SELECT max(price) FROM restaurant_pizzas WHERE restaurant_id = old.restaurant_id) END "
+    "WHERE restaurant_id = old.restaurant_id; "
+    "DELETE FROM restaurant_menu_stats WHERE restaurant_id = old.restaurant_id AND pizza_count <= 0; "
+)
+
+TRIGGERS = {
+    'restaurant_menu_stats_insert': ('AFTER INSERT', ADD),
+    'restaurant_menu_stats_delete': ('AFTER DELETE', REMOVE),
+    'restaurant_menu_stats_update': ('AFTER UPDATE OF restaurant_id, price', REMOVE + ADD),
+}
+
+
+def upgrade():
+    op.create_table('restaurant_menu_stats',
+    sa.Column('restaurant_id', sa.Integer(), nullable=False),
+    sa.Column('pizza_count', sa.Integer(), nullable=False),
+    sa.Column('price_total', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('price_min', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('price_max', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.ForeignKeyConstraint(['restaurant_id'], ['Restaurant.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('restaurant_id')
+    )
+
+    for name, (timing, body) in TRIGGERS.items():
+        op.execute(f'CREATE TRIGGER {name} {timing} ON restaurant_pizzas BEGIN {body}END')
+
+    # Stats for the menus that already exist
+    op.execute(
+        "INSERT INTO restaurant_menu_stats (restaurant_id, pizza_count, price_total, price_min, price_max) "
+        "SELECT restaurant_id, count(*), sum(price), min(price), max(price) "
+        "FROM restaurant_pizzas GROUP BY restaurant_id"
+    )
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+    op.drop_table('restaurant_menu_stats')
@@ -0,0 +1,90 @@
+"""add Ingredient and pizza_ingredients
+
+Revision ID: ac50106b5b8d
+Revises: 5ddcf5ac2c7c
+Create Date: 2026-10-18 16:48:52.204377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ac50106b5b8d'
+down_revision = '5ddcf5ac2c7c'
+branch_labels = None
+depends_on = None
+
+# Pizzas parsed per backfill statement batch
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def parse_ingredients(text):
+    # Same rules as server.models.parse_ingredients, frozen for this migration
+    names = {}
+    for part in (text or '').split(','):
+        name = ' '.join(part.split())[:50]
+        if name:
+            names.setdefault(name.lower(), name)
+    return list(names.values())
+
+
+def upgrade():
+    ingredient = op.create_table('Ingredient',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50, collation='NOCASE'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    pizza_ingredients = op.create_table('pizza_ingredients',
+    sa.Column('pizza_id', sa.Integer(), nullable=False),
+    sa.Column('ingredient_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ingredient_id'], ['Ingredient.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['pizza_id'], ['Pizza.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('pizza_id', 'ingredient_id')
+    )
+    op.create_index('ix_pizza_ingredients_ingredient_id_pizza_id', 'pizza_ingredients', ['ingredient_id', 'pizza_id'], unique=False)
+
+    # Backfill from the legacy ingredients strings, a chunk of pizzas at a time
+    conn = op.get_bind()
+    pizza = sa.table('Pizza', sa.column('id', sa.Integer), sa.column('ingredients', sa.String))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(pizza.c.id, pizza.c.ingredients)
+            .where(pizza.c.id > last_id)
+            .order_by(pizza.c.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        parsed = [(row.id, parse_ingredients(row.ingredients)) for row in rows]
+        names = {name for _, pizza_names in parsed for name in pizza_names}
+        if not names:
+            continue
+        conn.execute(
+            ingredient.insert().prefix_with('OR IGNORE'),
+            [{'name': name} for name in names],
+        )
+        ids = {
+            name.lower(): ingredient_id
+            for ingredient_id, name in conn.execute(
+                sa.select(ingredient.c.id, ingredient.c.name).where(ingredient.c.name.in_(names))
+            )
+        }
+        conn.execute(
+            pizza_ingredients.insert(),
+            [
+                {'pizza_id': pizza_id, 'ingredient_id': ids[name.lower()]}
+                for pizza_id, pizza_names in parsed
+                for name in pizza_names
+            ],
+        )
+
+
+def downgrade():
+    op.drop_index('ix_pizza_ingredients_ingredient_id_pizza_id', table_name='pizza_ingredients')
+    op.drop_table('pizza_ingredients')
+    op.drop_table('Ingredient')
@@ -0,0 +1,32 @@
+"""add restaurant_pizzas indexes
+
+Revision ID: c4ace1d29b03
+Revises: 1907e8e238ab
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4ace1d29b03'
+down_revision = '1907e8e238ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The pair must be unique before the unique index can be built: keep the
+    # most recent price (highest id) for any pizza listed twice on a menu
+    op.execute(
+        "DELETE FROM restaurant_pizzas WHERE id NOT IN ("
+        "SELECT MAX(id) FROM restaurant_pizzas GROUP BY restaurant_id, pizza_id)"
+    )
+    op.create_index('ix_restaurant_pizzas_restaurant_id_pizza_id', 'restaurant_pizzas', ['restaurant_id', 'pizza_id'], unique=True)
+    op.create_index('ix_restaurant_pizzas_pizza_id_price', 'restaurant_pizzas', ['pizza_id', 'price'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_restaurant_pizzas_pizza_id_price', table_name='restaurant_pizzas')
+    op.drop_index('ix_restaurant_pizzas_restaurant_id_pizza_id', table_name='restaurant_pizzas')
@@ -0,0 +1,60 @@
+"""cascade restaurant_pizzas deletes
+
+Revision ID: f3b63d1e2216
+Revises: 90760c2a6722
+Create Date: 2026-10-18 19:12:08.417552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b63d1e2216'
+down_revision = '90760c2a6722'
+branch_labels = None
+depends_on = None
+
+# The foreign keys were created without names; batch mode finds them by these
+NAMING_CONVENTION = {
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+}
+
+FOREIGN_KEYS = (
+    ('fk_restaurant_pizzas_restaurant_id_Restaurant', 'Restaurant', 'restaurant_id'),
+    ('fk_restaurant_pizzas_pizza_id_Pizza', 'Pizza', 'pizza_id'),
+)
+
+
+def recreate_foreign_keys(ondelete):
+    connection = op.get_bind()
+    # SQLite can't alter a constraint, so batch mode copies the table into a
+    # new one. Dropping the old table drops its triggers (change counters,
+    # menu stats), which are put back from their stored SQL afterwards.
+    triggers = connection.execute(sa.text(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'restaurant_pizzas'"
+    )).scalars().all()
+
+    with op.batch_alter_table('restaurant_pizzas', naming_convention=NAMING_CONVENTION) as batch_op:
+        for name, referred_table, column in FOREIGN_KEYS:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred_table, [column], ['id'], ondelete=ondelete)
+
+    for sql in triggers:
+        op.execute(sql)
+
+
+def upgrade():
+    # Entries left behind by a deleted restaurant or pizza would fail the
+    # copy into the new table now that foreign keys are enforced
+    op.execute(
+        'DELETE FROM restaurant_pizzas '
+        'WHERE restaurant_id NOT IN (SELECT id FROM "Restaurant") OR pizza_id NOT IN (SELECT id FROM "Pizza")'
+    )
+    op.execute('DELETE FROM pizza_ingredients WHERE pizza_id NOT IN (SELECT id FROM "Pizza")')
+
+    recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    recreate_foreign_keys(None)
@@ -1,21 +1,106 @@
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_restful import Api, Resource
+from flask_restful import Api
 from flask_marshmallow import Marshmallow
 
-# Create a Flask application
-app = Flask(__name__)
-api = Api(app)
-ma = Marshmallow(app)
+from server.cache import init_response_cache
+from server.instrumentation import init_instrumentation
+from server.sqlite import DEFAULT_SQLITE_PRAGMAS, apply_sqlite_pragmas
+
+# Extensions are created unbound; create_app binds them to each app it builds
+api = Api()
+ma = Marshmallow()
+db = SQLAlchemy()
+
+
+def create_app(config=None):
+    """Build and configure a Flask application.
+
+    ``config`` is a mapping applied over the defaults below (several of which
+    read the environment), before any extension is bound, so tests and tools
+    can point an app at their own database.
+    """
+    app = Flask(__name__)
+
+    # Configure the database URI and disable modification tracking
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI", "sqlite:///app.db")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # SQLite tuning profile applied on every pool connect (SQLITE_TUNING=0 turns it off)
+    app.config["SQLITE_TUNING_ENABLED"] = os.environ.get("SQLITE_TUNING", "1") != "0"
+    app.config["SQLITE_PRAGMAS"] = DEFAULT_SQLITE_PRAGMAS
+
+    # Per-request SQL counts and timings in the Server-Timing header and logs
+    app.config["SQL_INSTRUMENTATION_ENABLED"] = True
+
+    # Keyset pagination for the list routes
+    app.config["PAGINATION_DEFAULT_LIMIT"] = 50
+    app.config["PAGINATION_MAX_LIMIT"] = 500
+    # Max rows returned to clients that don't send pagination params
+    app.config["PAGINATION_SAFETY_CAP"] = 1000
+
+    # "marshmallow" or "compiled" (generated dump functions over column tuples)
+    app.config["SERIALIZER_DEFAULT_MODE"] = "marshmallow"
+    # Per-route overrides, keyed by endpoint name
+    app.config["SERIALIZER_MODES"] = {
+        "restaurants": "compiled",
+        "pizzas": "compiled",
+        "restaurantpizzas": "compiled",
+    }
+
+    # Rows fetched and serialized per batch by list routes called with ?stream=true
+    app.config["STREAMING_YIELD_PER"] = 1000
+
+    # Rows per batch written by the /export endpoints
+    app.config["EXPORT_BATCH_SIZE"] = 5000
+
+    # In-process cache for GET responses, keyed by route and query string
+    app.config["RESPONSE_CACHE_ENABLED"] = os.environ.get("RESPONSE_CACHE", "1") != "0"
+    app.config["RESPONSE_CACHE_BACKEND"] = "server.cache.LRUResponseCache"
+    app.config["RESPONSE_CACHE_MAX_BYTES"] = 64 * 1024 * 1024
+    app.config["RESPONSE_CACHE_DEFAULT_TTL"] = 30
+    # Per-route TTLs in seconds, keyed by endpoint name
+    app.config["RESPONSE_CACHE_TTLS"] = {
+        "restaurants": 60,
+        "pizzas": 60,
+    }
+
+    # Rows per transaction for POST /restaurantspizza/bulk
+    app.config["BULK_CHUNK_SIZE"] = 1000
+    app.config["BULK_MAX_CHUNK_SIZE"] = 5000
+
+    # Most sub-requests one POST /batch may carry
+    app.config["BATCH_MAX_REQUESTS"] = 50
+
+    # ASGI app (asgi.py): async engine URL, by default the same database through aiosqlite
+    app.config["ASYNC_DATABASE_URI"] = os.environ.get("ASYNC_DATABASE_URI")
+    # Connections the async engine keeps; requests beyond that wait for one
+    app.config["ASYNC_POOL_SIZE"] = 10
+
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    ma.init_app(app)
+
+    # Tune every SQLite connection the engine opens and instrument its queries
+    with app.app_context():
+        apply_sqlite_pragmas(app, db.engine)
+        init_instrumentation(app, db.engine)
+
+    # Importing the routes adds the resources to api, which registers them on the app
+    from server import routes  # noqa: F401
+
+    api.init_app(app)
 
-# Configure the database URI and disable modification tracking
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///app.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Initialize the response cache
+    init_response_cache(app)
 
-db = SQLAlchemy(app)
+    # flask seed, flask stats, and flask db (which loads Flask-Migrate and Alembic only when run)
+    from server.commands import init_commands
 
-# Initialize database and migration
-migrate = Migrate(app, db)
+    init_commands(app)
 
-from server import routes
\ No newline at end of file
+    return app
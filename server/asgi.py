@@ -0,0 +1,326 @@
+"""ASGI application serving the read routes with async SQLAlchemy sessions.
+
+``/``, ``/restaurants``, ``/restaurants/<id>``, ``/pizzas``, ``/pizzas/<id>``
+and ``/restaurantspizza`` run as coroutines on one event loop, with queries
+awaited on an ``AsyncSession`` over aiosqlite, so a slow client costs a
+suspended coroutine instead of a blocked worker thread. Each request still
+runs inside a Flask request context built from the ASGI scope: routing,
+query parameters, config, schemas, validations, ETags, the response cache
+and the ``Server-Timing`` hooks are the WSGI app's own, and so are the
+handlers (server/handlers.py), whose database calls are awaited here. Every
+other route is handed to the WSGI app on a worker thread.
+
+SQLAlchemy's asyncio extension and aiosqlite are only needed when this
+module's engine is created, at server startup.
+"""
+import asyncio
+import io
+import sys
+import threading
+from inspect import isgenerator
+
+from flask import g, request, request_started
+
+from server import db, handlers
+from server.cache import cache_lookup, cache_store
+from server.etag import etag_for, not_modified, ordered_versions, versions_statement
+from server.instrumentation import instrument_engine
+from server.sqlite import apply_sqlite_pragmas
+
+
+def create_async_engine_for(app):
+    """An async engine on the same database as ``db.engine``, through aiosqlite."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    with app.app_context():
+        url = app.config["ASYNC_DATABASE_URI"] or db.engine.url.set(drivername="sqlite+aiosqlite")
+
+    # aiosqlite defaults to a new connection per checkout; pool them like the sync engine does
+    engine = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=app.config["ASYNC_POOL_SIZE"],
+        max_overflow=0,
+    )
+    # Pragma and timing listeners run on the sync engine the async one drives
+    apply_sqlite_pragmas(app, engine.sync_engine)
+    if app.config["SQL_INSTRUMENTATION_ENABLED"]:
+        instrument_engine(engine.sync_engine)
+    return engine
+
+
+def wsgi_environ(scope, body):
+    # The WSGI environ for an ASGI http scope, as PEP 3333 spells it
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    # The body is read in full up front, so its length is known even when chunked
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+async def watch_disconnect(receive, disconnected):
+    # Once the body is read, the only message left for the request is the disconnect
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    disconnected.set()
+
+
+def response_start(status, headers):
+    return {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    }
+
+
+async def run(handler):
+    # server.handlers.run, awaiting each database call the handler yields
+    if not isgenerator(handler):
+        return handler
+    send, value = handler.send, None
+    while True:
+        try:
+            call = send(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            send, value = handler.send, await call
+        except Exception as e:
+            # Raised where the handler yielded the call, as on db.session
+            send, value = handler.throw, e
+
+
+# (endpoint, method) -> handler; the endpoints are the Api's, see server/routes.py
+HANDLERS = {
+    ("home", "GET"): handlers.home,
+    ("restaurants", "GET"): handlers.restaurants,
+    ("restaurantbyid", "GET"): handlers.restaurant_by_id,
+    ("restaurantbyid", "DELETE"): handlers.delete_restaurant,
+    ("pizzas", "GET"): handlers.pizzas,
+    ("pizzabyid", "GET"): handlers.pizza_by_id,
+    ("pizzabyid", "DELETE"): handlers.delete_pizza,
+    ("restaurantpizzas", "GET"): handlers.restaurant_pizzas,
+    ("restaurantpizzas", "POST"): handlers.create_restaurant_pizza,
+}
+
+
+class AsgiApp:
+    """ASGI callable wrapping the Flask ``app``.
+
+    The async engine is created at lifespan startup (or by the first request
+    on servers without lifespan events) and disposed at shutdown. Startup
+    runs under a lock, so concurrent first requests build one engine.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.engine = None
+        self.sessionmaker = None
+        self.startup_lock = asyncio.Lock()
+
+    async def startup(self):
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        async with self.startup_lock:
+            if self.engine is not None:
+                return
+            engine = create_async_engine_for(self.app)
+            # Objects stay readable after commit, as nothing can lazy-load them later
+            self.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+            self.engine = engine
+
+    async def shutdown(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = self.sessionmaker = None
+        # A lock is tied to the event loop it first waited on; a restart may run on another
+        self.startup_lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        environ = wsgi_environ(scope, bytes(body))
+
+        # A threading.Event, as the WSGI bridge's worker thread checks it too
+        disconnected = threading.Event()
+        watcher = asyncio.create_task(watch_disconnect(receive, disconnected))
+        try:
+            await self.respond(scope, environ, send, disconnected)
+        finally:
+            watcher.cancel()
+
+    async def respond(self, scope, environ, send, disconnected):
+        # Flask routing, with the Api's endpoint names, picks the handler
+        adapter = self.app.url_map.bind_to_environ(environ)
+        try:
+            endpoint, view_args = adapter.match()
+        except Exception:
+            endpoint, view_args = None, {}
+        handler = HANDLERS.get((endpoint, scope["method"]))
+
+        if handler is None:
+            await self.call_wsgi(environ, send, disconnected)
+            return
+
+        if self.engine is None:
+            await self.startup()
+
+        # Flask.wsgi_app, with the handler awaited. Contexts live in
+        # contextvars, which every asyncio task has its own copy of.
+        ctx = self.app.request_context(environ)
+        error = None
+        try:
+            ctx.push()
+            async with self.sessionmaker() as session:
+                try:
+                    response = await self.full_dispatch(session, handler, endpoint, view_args)
+                except Exception as e:
+                    error = e
+                    response = self.app.handle_exception(e)
+                await self.send_response(response, send, disconnected)
+        finally:
+            if error is not None and self.app.should_ignore_error(error):
+                error = None
+            # Runs the teardown_request and teardown_appcontext hooks
+            ctx.pop(error)
+
+    async def full_dispatch(self, session, handler, endpoint, view_args):
+        # Flask.full_dispatch_request: the before_request hooks, the handler,
+        # and any error through the app's (and Flask-RESTful's) handlers
+        try:
+            request_started.send(self.app)
+            response = self.app.preprocess_request()
+            if response is None:
+                response = await self.dispatch(session, handler, endpoint, view_args)
+        except Exception as e:
+            response = self.app.handle_user_exception(e)
+        return self.app.finalize_request(response)
+
+    async def dispatch(self, session, handler, endpoint, view_args):
+        # Apply the @conditional and @cached decorators of the WSGI route's method
+        method = getattr(self.app.view_functions[endpoint].view_class, request.method.lower())
+        etag_tables = getattr(method, "etag_tables", None)
+        cache_tags = getattr(method, "cache_tags", None)
+
+        etag = None
+        if etag_tables is not None:
+            rows = (await session.execute(versions_statement(etag_tables))).all() if etag_tables else []
+            g.table_versions = ordered_versions(rows, etag_tables)
+            etag = etag_for(g.table_versions)
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+
+        # Cache keys include the table versions read just above
+        use_cache = cache_tags is not None and etag is not None and self.app.config["RESPONSE_CACHE_ENABLED"]
+        response = cache_lookup() if use_cache else None
+        if response is None:
+            response = await run(handler(session, **view_args))
+            if use_cache:
+                response = cache_store(response, cache_tags, view_args)
+
+        if etag is not None and response.status_code == 200:
+            response.set_etag(etag)
+        return response
+
+    async def send_response(self, response, send, disconnected):
+        body = response.response
+        try:
+            await send(response_start(response.status_code, response.headers.items()))
+            if hasattr(body, "__aiter__"):
+                try:
+                    async for chunk in body:
+                        if disconnected.is_set():
+                            # Nobody is reading: stop fetching rows for the client
+                            return
+                        await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+                finally:
+                    await body.aclose()
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                await send({"type": "http.response.body", "body": response.get_data()})
+        finally:
+            # Runs the call_on_close callbacks, as a WSGI server would
+            response.close()
+
+    async def call_wsgi(self, environ, send, disconnected):
+        # Routes without an async handler run on the WSGI app in a worker
+        # thread. Chunks go out as the app yields them, and the thread waits
+        # for each send, so streamed exports keep their constant memory. A
+        # client that disconnects ends the thread at the next chunk.
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                started.append((int(status.split(" ", 1)[0]), headers))
+
+            body = self.app(environ, start_response)
+            try:
+                send_from_thread(response_start(*started[0]))
+                for chunk in body:
+                    if disconnected.is_set():
+                        return
+                    if chunk:
+                        send_from_thread({"type": "http.response.body", "body": chunk, "more_body": True})
+                send_from_thread({"type": "http.response.body", "body": b""})
+            finally:
+                if hasattr(body, "close"):
+                    body.close()
+
+        await loop.run_in_executor(None, run)
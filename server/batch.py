@@ -0,0 +1,171 @@
+from flask import current_app, g, make_response, request
+from sqlalchemy.orm import Session
+from werkzeug.test import EnvironBuilder
+
+from server import db
+from server.cache import invalidate
+from server.sqlite import immediate_transaction
+
+# Server-Timing figures of the sub-requests, added to the batch request's own
+TIMINGS = ("db", "queries", "serialize")
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse_batch():
+    """Read ``{"requests": [...], "atomic": false}`` from the request body.
+
+    Every sub-request is checked before any of them runs, so a malformed
+    batch is rejected as a whole.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("requests"), list):
+        raise BatchError('Body must be a JSON object with a "requests" list')
+
+    subrequests = body["requests"]
+    max_requests = current_app.config["BATCH_MAX_REQUESTS"]
+    if len(subrequests) > max_requests:
+        raise BatchError(f"A batch can hold at most {max_requests} requests")
+
+    atomic = body.get("atomic", False)
+    if not isinstance(atomic, bool):
+        raise BatchError("atomic must be true or false")
+
+    for index, subrequest in enumerate(subrequests):
+        if not isinstance(subrequest, dict):
+            raise BatchError(f"Request {index} must be a JSON object")
+        path = subrequest.get("path")
+        if not isinstance(path, str) or not path.startswith("/"):
+            raise BatchError(f"Request {index} needs a path starting with /")
+        if not isinstance(subrequest.get("method", "GET"), str):
+            raise BatchError(f"Request {index} method must be a string")
+        headers = subrequest.get("headers", {})
+        if not isinstance(headers, dict) or not all(isinstance(value, str) for value in headers.values()):
+            raise BatchError(f"Request {index} headers must be an object of strings")
+        if "body" in subrequest and "form" in subrequest:
+            raise BatchError(f"Request {index} can have a JSON body or form fields, not both")
+        if not isinstance(subrequest.get("form", {}), dict):
+            raise BatchError(f"Request {index} form must be an object")
+
+    return subrequests, atomic
+
+
+def subrequest_environ(subrequest):
+    builder = EnvironBuilder(
+        path=subrequest["path"],
+        base_url=request.root_url,
+        method=subrequest.get("method", "GET").upper(),
+        headers=subrequest.get("headers"),
+        json=subrequest.get("body"),
+        data=subrequest.get("form"),
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def failed(status, error):
+    return {"status": status, "headers": {}, "body": {"error": error}}
+
+
+def dispatch(subrequest, batch_timings):
+    """Run one sub-request through the app's routing, hooks and resources.
+
+    The request context reuses the batch's app context, so every
+    sub-request works on the same ``db.session``.
+    """
+    app = current_app._get_current_object()
+    with app.request_context(subrequest_environ(subrequest)):
+        if request.endpoint == "batch":
+            return failed(400, "Batches can't be nested")
+
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            # Leave the shared session usable for the next sub-request
+            db.session.rollback()
+            return failed(500, str(e))
+
+        try:
+            if response.is_json:
+                body = response.get_json()
+            else:
+                try:
+                    body = response.get_data(as_text=True) or None
+                except UnicodeDecodeError:
+                    return failed(406, "Only JSON and text responses can be batched")
+        finally:
+            # Runs the call_on_close callbacks, as a WSGI server would
+            response.close()
+
+        # Read after the body, which a streamed response only generates above
+        if batch_timings is not None and "timings" in g:
+            for name in TIMINGS:
+                batch_timings[name] += g.timings[name]
+
+        headers = {name: value for name, value in response.headers if name != "Content-Length"}
+        return {"status": response.status_code, "headers": headers, "body": body}
+
+
+def dispatch_atomic(subrequests, batch_timings):
+    """Run the sub-requests in one transaction, committed only if all succeed.
+
+    Each handler's own commit() or rollback() only releases or rolls back a
+    SAVEPOINT. The first response with a 4xx or 5xx status rolls the whole
+    batch back, and the sub-requests after it are not run. Responses aren't
+    cached while the transaction is open, and cache invalidations wait for
+    the commit.
+    """
+    with immediate_transaction(db.engine) as (connection, transaction):
+        session = Session(bind=connection, join_transaction_mode="create_savepoint")
+        db.session.registry.set(session)
+        g.deferred_invalidations = set()
+
+        responses, rolled_back = [], False
+        for subrequest in subrequests:
+            if rolled_back:
+                responses.append(failed(424, "Not run: an earlier request in the batch failed"))
+                continue
+            response = dispatch(subrequest, batch_timings)
+            responses.append(response)
+            rolled_back = response["status"] >= 400
+
+        session.close()
+        tags = g.pop("deferred_invalidations")
+        if rolled_back:
+            transaction.rollback()
+        else:
+            transaction.commit()
+            if tags:
+                invalidate(*tags)
+
+    return responses, rolled_back
+
+
+def batch_response():
+    """Build the POST /batch response: one entry per sub-request, in order.
+
+    The status is 200 when every sub-request succeeded and 207 otherwise.
+    """
+    try:
+        subrequests, atomic = parse_batch()
+    except BatchError as e:
+        return make_response({"errors": [str(e)]}, 400)
+
+    batch_timings = g.get("timings")
+    # A fresh app context gives the sub-requests one session (and g) of their
+    # own, leaving the batch request's timings alone
+    with current_app.app_context():
+        if atomic:
+            responses, rolled_back = dispatch_atomic(subrequests, batch_timings)
+        else:
+            responses = [dispatch(subrequest, batch_timings) for subrequest in subrequests]
+
+    response_dict = {"responses": responses}
+    if atomic:
+        response_dict["rolled_back"] = rolled_back
+
+    return make_response(response_dict, 207 if any(r["status"] >= 400 for r in responses) else 200)
@@ -0,0 +1,329 @@
+import json
+
+from flask import current_app, make_response, request
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from server import db
+from server.cache import invalidate
+from server.filters import pizzas_with_any_ingredient, pizzas_with_ingredients
+from server.models import Pizza, Restaurant, RestaurantPizza, check_price, parse_ingredients
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson")
+
+
+class BulkError(ValueError):
+    pass
+
+
+def parse_chunk_size(value):
+    if value is None:
+        return current_app.config["BULK_CHUNK_SIZE"]
+    try:
+        chunk_size = int(value)
+    except ValueError:
+        raise BulkError("chunk_size must be an integer")
+    if chunk_size < 1:
+        raise BulkError("chunk_size must be greater than 0")
+    return min(chunk_size, current_app.config["BULK_MAX_CHUNK_SIZE"])
+
+
+def iter_records():
+    """Yield ``(index, record)`` pairs from the request body.
+
+    NDJSON bodies are read line by line from the request stream so the whole
+    payload is never held in memory; anything else must be a JSON array.
+    A line that isn't valid JSON is yielded as an exception for that row.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        index = 0
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError:
+                yield index, BulkError("Invalid JSON")
+            index += 1
+        return
+
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        raise BulkError("Body must be a JSON array or NDJSON")
+    yield from enumerate(records)
+
+
+def iter_chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_record(record):
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise BulkError("Row must be a JSON object")
+
+    for field in ("price", "pizza_name", "restaurant_name"):
+        if record.get(field) is None:
+            raise BulkError(f"Missing {field}")
+    for field in ("pizza_name", "restaurant_name"):
+        if not isinstance(record[field], str):
+            raise BulkError(f"{field} must be a string")
+
+    try:
+        price = float(record["price"])
+    except (TypeError, ValueError):
+        raise BulkError("Price must be a number")
+    return check_price(price), record["pizza_name"], record["restaurant_name"]
+
+
+def insert_chunk(chunk):
+    """Validate and insert one chunk in its own transaction.
+
+    Returns the number of inserted rows and the per-row error reports.
+    """
+    errors = []
+    valid = []
+    for index, record in chunk:
+        try:
+            valid.append((index, *validate_record(record)))
+        except ValueError as e:
+            errors.append({"index": index, "errors": [str(e)]})
+
+    # Resolve every referenced name with one query per table
+    pizza_ids = dict(
+        db.session.execute(
+            select(Pizza.name, Pizza.id).where(Pizza.name.in_({row[2] for row in valid}))
+        ).all()
+    )
+    restaurant_ids = dict(
+        db.session.execute(
+            select(Restaurant.name, Restaurant.id).where(
+                Restaurant.name.in_({row[3] for row in valid})
+            )
+        ).all()
+    )
+
+    resolved = []
+    for index, price, pizza_name, restaurant_name in valid:
+        row_errors = []
+        if pizza_name not in pizza_ids:
+            row_errors.append("Pizza not found")
+        if restaurant_name not in restaurant_ids:
+            row_errors.append("Restaurant not found")
+        if row_errors:
+            errors.append({"index": index, "errors": row_errors})
+        else:
+            resolved.append(
+                (index, price, pizza_ids[pizza_name], restaurant_ids[restaurant_name])
+            )
+
+    # Menu entries that already exist, looked up through the unique index
+    pairs = {(restaurant_id, pizza_id) for _, _, pizza_id, restaurant_id in resolved}
+    existing = set()
+    if pairs:
+        existing = set(
+            db.session.execute(
+                select(RestaurantPizza.restaurant_id, RestaurantPizza.pizza_id).where(
+                    tuple_(RestaurantPizza.restaurant_id, RestaurantPizza.pizza_id).in_(pairs)
+                )
+            ).all()
+        )
+
+    rows = []
+    for index, price, pizza_id, restaurant_id in resolved:
+        if (restaurant_id, pizza_id) in existing:
+            errors.append({"index": index, "errors": ["Pizza is already on this restaurant's menu"]})
+            continue
+        # Also catches the same pair appearing twice in one chunk
+        existing.add((restaurant_id, pizza_id))
+        rows.append(
+            {"index": index, "price": price, "pizza_id": pizza_id, "restaurant_id": restaurant_id}
+        )
+
+    # Report errors in input order
+    errors.sort(key=lambda error: error["index"])
+
+    if not rows:
+        db.session.rollback()
+        return 0, errors
+
+    try:
+        # executemany of a single INSERT statement
+        db.session.execute(
+            insert(RestaurantPizza),
+            [{key: row[key] for key in ("price", "pizza_id", "restaurant_id")} for row in rows],
+        )
+        db.session.commit()
+    except IntegrityError as e:
+        # Lost a race with a concurrent writer: the whole chunk is rolled back
+        db.session.rollback()
+        errors.extend({"index": row["index"], "errors": [str(e.orig)]} for row in rows)
+        errors.sort(key=lambda error: error["index"])
+        return 0, errors
+
+    return len(rows), errors
+
+
+def name_prefix(column):
+    def condition(value):
+        if not isinstance(value, str) or not value:
+            raise BulkError("name_prefix must be a non-empty string")
+        # A range rather than LIKE, so the unique index on the name serves it
+        return column.between(value, value + "\U0010ffff")
+
+    return condition
+
+
+def equals(column):
+    def condition(value):
+        if not isinstance(value, str):
+            raise BulkError(f"{column.key} must be a string")
+        return column == value
+
+    return condition
+
+
+def ingredient_list(match):
+    def condition(value):
+        if not isinstance(value, str) or not parse_ingredients(value):
+            raise BulkError("ingredient filters must be comma separated names")
+        return match(parse_ingredients(value))
+
+    return condition
+
+
+# Filters DELETE /restaurants and DELETE /pizzas accept in their body
+RESTAURANT_DELETE_FILTERS = {
+    "name_prefix": name_prefix(Restaurant.name),
+    "address": equals(Restaurant.address),
+}
+PIZZA_DELETE_FILTERS = {
+    "name_prefix": name_prefix(Pizza.name),
+    "ingredients": ingredient_list(lambda names: Pizza.id.in_(pizzas_with_ingredients(names))),
+    "exclude": ingredient_list(lambda names: Pizza.id.not_in(pizzas_with_any_ingredient(names))),
+}
+
+
+def parse_delete_body(filters):
+    """Read ``{"ids": [...]}`` or ``{"filter": {...}}`` from the request body.
+
+    Returns the sorted, distinct ids or the list of filter conditions. An
+    empty filter is refused: deleting every row takes an explicit id list.
+    Other keys, and filter values of the wrong type, are refused too.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or len(body.keys() & {"ids", "filter"}) != 1:
+        raise BulkError('Body must be a JSON object with either "ids" or "filter"')
+    # A misspelt or unsupported option (say "dry_run") must not go ahead and delete
+    unknown = body.keys() - {"ids", "filter"}
+    if unknown:
+        raise BulkError(f"Unknown key {', '.join(sorted(unknown))}; the body takes \"ids\" or \"filter\"")
+
+    if "ids" in body:
+        ids = body["ids"]
+        if not isinstance(ids, list) or not all(type(id) is int for id in ids):
+            raise BulkError("ids must be a list of integers")
+        return sorted(set(ids)), None
+
+    conditions = body["filter"]
+    if not isinstance(conditions, dict) or not conditions:
+        raise BulkError("filter must be a non-empty object")
+    unknown = conditions.keys() - filters.keys()
+    if unknown:
+        raise BulkError(f"Unknown filter {', '.join(sorted(unknown))}; use: {', '.join(filters)}")
+    return None, [filters[name](value) for name, value in conditions.items()]
+
+
+def delete_parents(model, foreign_key, ids, conditions, chunk_size):
+    """Delete restaurants or pizzas, and their menu entries, in bounded transactions.
+
+    Matching parents are taken ``chunk_size`` at a time in id order. Their
+    menu entries go first, ``chunk_size`` rows per DELETE and commit, then
+    the parents in one DELETE whose cascade only has ingredient links and
+    stats rows left to remove. No transaction touches more than about
+    ``chunk_size`` menu rows, so the write lock is released between chunks.
+    Yields ``(parent_ids, menu_rows_deleted)`` after each committed parent chunk.
+    """
+    after = 0
+    while True:
+        if ids is not None:
+            chunk = ids[after : after + chunk_size]
+            if not chunk:
+                return
+            after += chunk_size
+            # Only the ids that exist, read off the primary key
+            parent_ids = db.session.execute(select(model.id).where(model.id.in_(chunk))).scalars().all()
+        else:
+            parent_ids = db.session.execute(
+                select(model.id).where(*conditions, model.id > after).order_by(model.id).limit(chunk_size)
+            ).scalars().all()
+            if not parent_ids:
+                return
+            after = parent_ids[-1]
+
+        menu_deleted = 0
+        while parent_ids:
+            entries = select(RestaurantPizza.id).where(foreign_key.in_(parent_ids)).limit(chunk_size)
+            deleted = db.session.execute(
+                delete(RestaurantPizza).where(RestaurantPizza.id.in_(entries)),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+            db.session.commit()
+            menu_deleted += deleted
+            if deleted < chunk_size:
+                break
+
+        if parent_ids:
+            db.session.execute(
+                delete(model).where(model.id.in_(parent_ids)),
+                execution_options={"synchronize_session": False},
+            )
+            db.session.commit()
+
+        yield parent_ids, menu_deleted
+
+
+def bulk_delete(model, foreign_key, filters):
+    """Build the DELETE /restaurants and DELETE /pizzas response.
+
+    Reports how many parents and menu entries were deleted and, for an id
+    list, the ids that didn't exist. A failure part way through reports the
+    chunks already committed along with the error.
+    """
+    try:
+        chunk_size = parse_chunk_size(request.args.get("chunk_size"))
+        ids, conditions = parse_delete_body(filters)
+    except BulkError as e:
+        return make_response({"errors": [str(e)]}, 400)
+
+    table = model.__tablename__
+    deleted, menu_deleted, found = 0, 0, set()
+    try:
+        for parent_ids, chunk_menu_deleted in delete_parents(model, foreign_key, ids, conditions, chunk_size):
+            deleted += len(parent_ids)
+            menu_deleted += chunk_menu_deleted
+            found.update(parent_ids)
+
+            # Drop the cached responses built from the deleted rows
+            if parent_ids:
+                invalidate(table, *(f"{table}:{id}" for id in parent_ids))
+            if chunk_menu_deleted:
+                invalidate("restaurant_pizzas")
+    except Exception as e:
+        db.session.rollback()
+        response_dict = {"errors": [str(e)], "deleted": deleted, "restaurant_pizzas_deleted": menu_deleted}
+        return make_response(response_dict, 500)
+
+    response_dict = {"deleted": deleted, "restaurant_pizzas_deleted": menu_deleted}
+    if ids is not None:
+        response_dict["not_found"] = [id for id in ids if id not in found]
+
+    return make_response(response_dict, 200)
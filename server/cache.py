@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, current_app, g, request
+from werkzeug.utils import import_string
+
+
+class LRUResponseCache:
+    """In-process response cache bounded by the total size of cached bodies.
+
+    Entries expire after their TTL, the least recently used entries are
+    evicted first, and every entry carries tags so writes can drop exactly
+    the responses they affect. Any object with the same ``get``/``set``/
+    ``invalidate``/``clear``/``stats`` methods can replace it through the
+    ``RESPONSE_CACHE_BACKEND`` setting.
+    """
+
+    def __init__(self, max_bytes, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.size = 0
+        self.entries = OrderedDict()
+        self.tags = defaultdict(set)
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def get(self, route, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires"] <= self.clock():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses[route] += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits[route] += 1
+            return entry
+
+    def set(self, key, status, headers, body, ttl, tags):
+        size = len(body)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+            self.entries[key] = {
+                "status": status,
+                "headers": headers,
+                "body": body,
+                "expires": self.clock() + ttl,
+                "tags": tags,
+            }
+            self.size += size
+            for tag in tags:
+                self.tags[tag].add(key)
+
+            # Evict least recently used entries until we fit again
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, *tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.pop(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry["body"])
+        for tag in entry["tags"]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+def init_response_cache(app):
+    backend = import_string(app.config["RESPONSE_CACHE_BACKEND"])
+    app.extensions["response_cache"] = backend(app.config["RESPONSE_CACHE_MAX_BYTES"])
+
+
+def cache_key():
+    """Route, query string (in any parameter order) and table change counters.
+
+    The counters are the ones ``@conditional`` read for this request. A write
+    from any process moves them, so a cached body is only found again while
+    the tables it was built from are unchanged. Tag invalidation just frees
+    the memory of stale entries sooner.
+    """
+    query = urlencode(sorted(request.args.items(multi=True)))
+    versions = ",".join(map(str, g.table_versions))
+    return f"{request.path}?{query}@{versions}"
+
+
+def cache_lookup():
+    # The cached response for this request, or None on a miss
+    entry = current_app.extensions["response_cache"].get(request.endpoint, cache_key())
+    if entry is None:
+        return None
+    response = Response(entry["body"], status=entry["status"], headers=entry["headers"])
+    response.headers["X-Cache"] = "HIT"
+    return response
+
+
+def cache_store(response, tags, view_args):
+    if response.status_code == 200 and not response.is_streamed:
+        route = request.endpoint
+        ttl = current_app.config["RESPONSE_CACHE_TTLS"].get(
+            route, current_app.config["RESPONSE_CACHE_DEFAULT_TTL"]
+        )
+        headers = [(name, value) for name, value in response.headers if name != "ETag"]
+        current_app.extensions["response_cache"].set(
+            cache_key(),
+            response.status_code,
+            headers,
+            response.get_data(),
+            ttl,
+            [tag.format(**view_args) for tag in tags],
+        )
+    response.headers["X-Cache"] = "MISS"
+    return response
+
+
+def cached(*tags):
+    """Cache a GET handler's 200 responses under the route, query string and
+    the table versions read by ``@conditional``, which must wrap it.
+
+    ``tags`` name what the response was built from (table names, or
+    ``"Table:{id}"`` formatted with the view arguments) and are what
+    :func:`invalidate` matches on. TTLs come from ``RESPONSE_CACHE_TTLS``
+    keyed by endpoint, falling back to ``RESPONSE_CACHE_DEFAULT_TTL``.
+    """
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            # Inside an atomic batch (server/batch.py) reads may see uncommitted writes
+            if (
+                not current_app.config["RESPONSE_CACHE_ENABLED"]
+                or "deferred_invalidations" in g
+                or "table_versions" not in g
+            ):
+                return handler(*args, **kwargs)
+
+            response = cache_lookup()
+            if response is not None:
+                return response
+
+            return cache_store(handler(*args, **kwargs), tags, kwargs)
+
+        # Read by the ASGI app (server/asgi.py), which caches responses itself
+        wrapper.cache_tags = tags
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*tags):
+    deferred = g.get("deferred_invalidations")
+    if deferred is not None:
+        # Nothing is committed until the atomic batch is; it invalidates then
+        deferred.update(tags)
+        return
+    current_app.extensions["response_cache"].invalidate(*tags)
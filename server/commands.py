@@ -0,0 +1,104 @@
+import time
+
+import click
+from flask.cli import AppGroup, ScriptInfo, with_appcontext
+
+from server import db
+from server.generator import generate_catalog
+from server.models import table_versions
+from server.stats import check_menu_stats, rebuild_menu_stats
+
+
+@click.command("seed")
+@click.option("--restaurants", default=100, show_default=True, help="Restaurants to create.")
+@click.option("--pizzas", default=200, show_default=True, help="Pizzas to create.")
+@click.option("--menu-mean", default=20, show_default=True, help="Average pizzas per restaurant.")
+@click.option("--menu-sigma", default=0.6, show_default=True, help="Spread of the log-normal menu sizes.")
+@click.option("--zipf", "zipf_exponent", default=1.1, show_default=True, help="Zipf exponent of pizza popularity.")
+@click.option("--seed", default=0, show_default=True, help="Random seed; the same seed gives the same data.")
+@click.option("--chunk-size", default=10_000, show_default=True, help="Rows per INSERT executemany.")
+@click.option("--reset", is_flag=True, help="Delete all existing rows first.")
+@with_appcontext
+def seed(restaurants, pizzas, menu_mean, menu_sigma, zipf_exponent, seed, chunk_size, reset):
+    """Fill the database with a generated catalog."""
+    if reset:
+        for table in reversed(db.metadata.sorted_tables):
+            # The change counters keep counting up, so no ETag or cached
+            # version from before the reset can match the new rows
+            if table is not table_versions:
+                db.session.execute(table.delete())
+        db.session.commit()
+
+    start = time.perf_counter()
+    counts = generate_catalog(
+        restaurants=restaurants,
+        pizzas=pizzas,
+        menu_mean=menu_mean,
+        menu_sigma=menu_sigma,
+        zipf_exponent=zipf_exponent,
+        seed=seed,
+        chunk_size=chunk_size,
+    )
+    elapsed = time.perf_counter() - start
+
+    summary = ", ".join(f"{count} {table}" for table, count in counts.items())
+    click.echo(f"Seeded {summary} in {elapsed:.1f}s.")
+
+
+stats_cli = AppGroup("stats", help="Maintain the precomputed restaurant menu stats.")
+
+
+@stats_cli.command("rebuild")
+def rebuild_stats():
+    """Recompute restaurant_menu_stats from restaurant_pizzas."""
+    start = time.perf_counter()
+    rows = rebuild_menu_stats()
+    click.echo(f"Rebuilt stats for {rows} restaurants in {time.perf_counter() - start:.1f}s.")
+
+
+@stats_cli.command("check")
+def check_stats():
+    """Compare restaurant_menu_stats with restaurant_pizzas; exit 1 on drift."""
+    mismatched = check_menu_stats()
+    if mismatched:
+        shown = ", ".join(str(restaurant_id) for restaurant_id in mismatched[:20])
+        more = f" and {len(mismatched) - 20} more" if len(mismatched) > 20 else ""
+        click.echo(f"Stats differ for {len(mismatched)} restaurants: {shown}{more}. Run `flask stats rebuild`.", err=True)
+        raise SystemExit(1)
+    click.echo("Stats are consistent.")
+
+
+class MigrateGroup(click.Group):
+    """``flask db``, loading Flask-Migrate (and with it Alembic) only when run.
+
+    Importing them costs every process that builds the app, though only the
+    migration commands use them. The first lookup of a subcommand binds
+    Migrate to the app and hands over to Flask-Migrate's own group.
+    """
+
+    def migrate_commands(self, ctx):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_cli_group
+
+        from server.sqlite import include_name
+
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if "migrate" not in app.extensions:
+            # Leave the full-text indexes out of autogenerate
+            Migrate(app, db, include_name=include_name)
+        return db_cli_group
+
+    def list_commands(self, ctx):
+        return self.migrate_commands(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.migrate_commands(ctx).get_command(ctx, name)
+
+
+migrate_cli = MigrateGroup("db", help="Perform database migrations.")
+
+
+def init_commands(app):
+    app.cli.add_command(seed)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(migrate_cli)
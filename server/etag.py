@@ -0,0 +1,73 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, g, request
+from sqlalchemy import select
+
+from server import db
+from server.models import table_versions
+
+
+def versions_statement(tables):
+    # One primary-key lookup on a tiny table; no ORM objects involved
+    return select(table_versions.c.table_name, table_versions.c.version).where(
+        table_versions.c.table_name.in_(tables)
+    )
+
+
+def ordered_versions(rows, tables):
+    versions = dict(rows)
+    return [versions.get(table, 0) for table in tables]
+
+
+def current_versions(tables):
+    return ordered_versions(db.session.execute(versions_statement(tables)).all(), tables)
+
+
+def etag_for(versions):
+    # The body depends on the path, the query string and the tables read
+    key = f"{request.full_path}|{','.join(map(str, versions))}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def conditional(*tables):
+    """Tag a GET handler's response with a strong ETag built from the change
+    counters of ``tables``, answering a matching ``If-None-Match`` with 304
+    before the handler runs.
+    """
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            if "deferred_invalidations" in g:
+                # Inside an atomic batch (server/batch.py) the counters may be
+                # uncommitted; a rollback would let them be reused for other data
+                response = handler(*args, **kwargs)
+                del response.headers["ETag"]
+                return response
+
+            versions = current_versions(tables) if tables else []
+            # The response cache (server/cache.py) keys its entries by these
+            g.table_versions = versions
+            etag = etag_for(versions)
+
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+
+            response = handler(*args, **kwargs)
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+
+        # Read by the ASGI app (server/asgi.py), which tags responses itself
+        wrapper.etag_tables = tables
+        return wrapper
+
+    return decorator
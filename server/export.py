@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+import zlib
+
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import select
+
+from server import db
+from server.models import Pizza, Restaurant, RestaurantPizza
+
+EXPORT_COLUMNS = (
+    RestaurantPizza.id.label("id"),
+    Restaurant.id.label("restaurant_id"),
+    Restaurant.name.label("restaurant_name"),
+    Pizza.id.label("pizza_id"),
+    Pizza.name.label("pizza_name"),
+    Pizza.ingredients.label("ingredients"),
+    RestaurantPizza.price.label("price"),
+    RestaurantPizza.created_at.label("created_at"),
+    RestaurantPizza.updated_at.label("updated_at"),
+)
+
+FIELDNAMES = [column.key for column in EXPORT_COLUMNS]
+
+MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_columns(fields=None):
+    # The labeled columns for the requested fields, in export order
+    if fields is None:
+        return EXPORT_COLUMNS
+    return tuple(column for column in EXPORT_COLUMNS if column.key in fields)
+
+
+def iter_batches(columns):
+    # A single join read straight off the cursor as plain row tuples
+    batch_size = current_app.config["EXPORT_BATCH_SIZE"]
+    statement = (
+        select(*columns)
+        .join(Restaurant, RestaurantPizza.restaurant_id == Restaurant.id)
+        .join(Pizza, RestaurantPizza.pizza_id == Pizza.id)
+        .order_by(RestaurantPizza.id)
+        .execution_options(yield_per=batch_size)
+    )
+    yield from db.session.execute(statement).partitions()
+
+
+def plain(row):
+    # Same representations the API uses: decimal strings and ISO timestamps
+    values = list(row)
+    for i, value in enumerate(values):
+        if hasattr(value, "isoformat"):
+            values[i] = value.isoformat()
+        elif value is not None and not isinstance(value, (int, str)):
+            values[i] = str(value)
+    return values
+
+
+def encode_ndjson(batch, first, fieldnames):
+    return "".join(
+        json.dumps(dict(zip(fieldnames, plain(row))), separators=(",", ":")) + "\n"
+        for row in batch
+    )
+
+
+def encode_csv(batch, first, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if first:
+        writer.writerow(fieldnames)
+    writer.writerows(plain(row) for row in batch)
+    return buffer.getvalue()
+
+
+def export_response(format, compress=False, fields=None):
+    """Stream the denormalized restaurant_pizzas join as NDJSON or CSV.
+
+    ``fields`` limits the export to those columns, in export order.
+    """
+    encode = encode_ndjson if format == "ndjson" else encode_csv
+    columns = export_columns(fields)
+    fieldnames = [column.key for column in columns]
+
+    def generate():
+        first = True
+        for batch in iter_batches(columns):
+            yield encode(batch, first, fieldnames)
+            first = False
+        if first and format == "csv":
+            # Empty table: still send the header row
+            yield encode([], first, fieldnames)
+
+    def gzipped(chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode())
+            if data:
+                yield data
+        yield compressor.flush()
+
+    body = gzipped(generate()) if compress else generate()
+
+    response = Response(stream_with_context(body), mimetype=MIMETYPES[format])
+    response.headers["Content-Disposition"] = f"attachment; filename=restaurantspizza.{format}"
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
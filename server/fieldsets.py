@@ -0,0 +1,63 @@
+from functools import lru_cache
+
+from flask import request
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+
+class FieldsetError(ValueError):
+    pass
+
+
+def requested_fields(allowed):
+    """Parse ``?fields=a,b`` against the ``allowed`` field names.
+
+    Returns None when the parameter is absent. Unknown names are rejected
+    before any query runs.
+    """
+    raw = request.args.get("fields")
+    if raw is None:
+        return None
+
+    names = [name.strip() for name in raw.split(",") if name.strip()]
+    if not names:
+        raise FieldsetError("fields must name at least one field")
+
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise FieldsetError(f"Unknown field(s): {', '.join(unknown)}")
+
+    # Drop duplicates, keep the order
+    return tuple(dict.fromkeys(names))
+
+
+@lru_cache(maxsize=None)
+def schema_only(schema, fields):
+    # One narrowed schema instance per (schema, fieldset), reused across requests
+    return type(schema)(only=fields, many=schema.many)
+
+
+def column_options(model, schema, required=()):
+    # Load only the columns the (narrowed) schema dumps; the primary key always comes along
+    columns = inspect(model).column_attrs
+    return load_only(
+        *[
+            getattr(model, field.attribute or key)
+            for key, field in schema.dump_fields.items()
+            if (field.attribute or key) in columns
+        ],
+        *required,
+    )
+
+
+def apply_fieldset(query, model, schema, required=()):
+    """Narrow ``schema`` and the columns ``query`` loads to ``?fields=``.
+
+    ``required`` columns are loaded even when they aren't requested.
+    """
+    fields = requested_fields(schema.dump_fields)
+    if fields is None:
+        return query, schema
+
+    schema = schema_only(schema, fields)
+    return query.options(column_options(model, schema, required)), schema
@@ -0,0 +1,121 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import request
+from sqlalchemy import func, select
+
+from server.models import Ingredient, Pizza, RestaurantPizza, parse_ingredients, pizza_ingredients
+
+# Sorts /restaurantspizza accepts, each backed by an index that returns rows
+# already in (column, id) order: ix_restaurant_pizzas_price,
+# ix_restaurant_pizzas_created_at and the primary key
+RESTAURANT_PIZZA_SORTS = {
+    "id": RestaurantPizza.id,
+    "price": RestaurantPizza.price,
+    "created_at": RestaurantPizza.created_at,
+}
+
+
+class FilterError(ValueError):
+    pass
+
+
+def parse_arg(name, convert, message):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return convert(value)
+    except (ValueError, InvalidOperation):
+        raise FilterError(f"{name} must be {message}")
+
+
+def parse_sort(sorts):
+    """Parse ``?sort=column`` or ``?sort=-column`` against a whitelist.
+
+    Returns a ``(column, descending)`` pair for :func:`server.pagination.paginate`,
+    or None for the default id order.
+    """
+    value = request.args.get("sort")
+    if value is None or value == "id":
+        return None
+    descending = value.startswith("-")
+    name = value[1:] if descending else value
+    if name not in sorts:
+        raise FilterError(f"sort must be one of: {', '.join(sorts)} (prefix with - for descending)")
+    return sorts[name], descending
+
+
+def filter_restaurant_pizzas(query):
+    """Apply the /restaurantspizza query parameters to ``query``.
+
+    Returns the filtered query and the sort for :func:`server.pagination.paginate`.
+    Without ``sort``, a price or created_at range alone is ordered by that
+    column, and anything else by id. Every filter, alone or combined, can be answered from an index:
+    restaurant_id and pizza_id lead the composite indexes, and the price and
+    created_at ranges have their own.
+    """
+    restaurant_id = parse_arg("restaurant_id", int, "an integer")
+    pizza_id = parse_arg("pizza_id", int, "an integer")
+    price_min = parse_arg("price_min", Decimal, "a number")
+    price_max = parse_arg("price_max", Decimal, "a number")
+    created_after = parse_arg("created_after", datetime.fromisoformat, "an ISO 8601 date or datetime")
+    sort = parse_sort(RESTAURANT_PIZZA_SORTS)
+
+    if restaurant_id is not None:
+        query = query.filter(RestaurantPizza.restaurant_id == restaurant_id)
+    if pizza_id is not None:
+        query = query.filter(RestaurantPizza.pizza_id == pizza_id)
+    if price_min is not None:
+        query = query.filter(RestaurantPizza.price >= price_min)
+    if price_max is not None:
+        query = query.filter(RestaurantPizza.price <= price_max)
+    if created_after is not None:
+        query = query.filter(RestaurantPizza.created_at > created_after)
+
+    if "sort" not in request.args and restaurant_id is None and pizza_id is None:
+        # A bare range comes back in its own index's order. In id order SQLite
+        # would rather walk the whole table by rowid than search the index.
+        if price_min is not None or price_max is not None:
+            sort = RestaurantPizza.price, False
+        elif created_after is not None:
+            sort = RestaurantPizza.created_at, False
+
+    return query, sort
+
+
+def pizzas_with_ingredients(names):
+    # Relational division: pizzas linked to every one of ``names``
+    return (
+        select(pizza_ingredients.c.pizza_id)
+        .join(Ingredient, Ingredient.id == pizza_ingredients.c.ingredient_id)
+        .where(Ingredient.name.in_(names))
+        .group_by(pizza_ingredients.c.pizza_id)
+        .having(func.count() == len(names))
+    )
+
+
+def pizzas_with_any_ingredient(names):
+    return (
+        select(pizza_ingredients.c.pizza_id)
+        .join(Ingredient, Ingredient.id == pizza_ingredients.c.ingredient_id)
+        .where(Ingredient.name.in_(names))
+    )
+
+
+def filter_pizzas(query):
+    """Apply ``?ingredients=a,b`` (all of them) and ``?exclude=c`` (none of them).
+
+    Both compile to subqueries on pizza_ingredients that start from the
+    ingredient names' unique index and read (ingredient_id, pizza_id) index
+    ranges. Names are matched case-insensitively.
+    """
+    required = parse_ingredients(request.args.get("ingredients"))
+    excluded = parse_ingredients(request.args.get("exclude"))
+
+    if required:
+        query = query.filter(Pizza.id.in_(pizzas_with_ingredients(required)))
+    if excluded:
+        query = query.filter(Pizza.id.not_in(pizzas_with_any_ingredient(excluded)))
+
+    return query
@@ -0,0 +1,141 @@
+import itertools
+import math
+import random
+
+from server import db
+from server.models import Pizza, Restaurant, RestaurantPizza, sync_ingredients
+
+INGREDIENTS = [
+    "Tomato Sauce", "Cheese", "Pepperoni", "Mushrooms", "Sausage", "Onions",
+    "Green Peppers", "Olives", "Ham", "Pineapple", "Bacon", "Chicken",
+    "Spinach", "Garlic", "Basil", "Jalapenos", "Anchovies", "Feta",
+]
+
+FAKER_POOL_SIZE = 2000
+
+
+def zipf_cum_weights(count, exponent):
+    # Cumulative weights of ranks 1..count under a Zipf(exponent) law
+    return list(itertools.accumulate(1 / rank**exponent for rank in range(1, count + 1)))
+
+
+def menu_size(rng, mean, sigma, upper):
+    # Log-normal sizes: most menus near the mean, a long tail of big ones
+    mu = math.log(mean) - sigma**2 / 2
+    return max(1, min(upper, round(rng.lognormvariate(mu, sigma))))
+
+
+def sample_menu(rng, pizza_ids, cum_weights, size):
+    # Popular pizzas are drawn first; uniform fill once the head is exhausted
+    menu = set()
+    for _ in range(10):
+        menu.update(rng.choices(pizza_ids, cum_weights=cum_weights, k=size - len(menu)))
+        if len(menu) == size:
+            return menu
+    remaining = [pizza_id for pizza_id in pizza_ids if pizza_id not in menu]
+    menu.update(rng.sample(remaining, size - len(menu)))
+    return menu
+
+
+def insert_chunks(table, rows, chunk_size, on_chunk=None):
+    """Insert ``rows`` with one executemany per chunk, committing each chunk.
+
+    ``on_chunk(chunk)`` runs after each insert, in the same transaction.
+    """
+    inserted = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return inserted
+        db.session.execute(table.insert(), chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+        db.session.commit()
+        inserted += len(chunk)
+
+
+def generate_catalog(
+    restaurants=100,
+    pizzas=200,
+    menu_mean=20,
+    menu_sigma=0.6,
+    zipf_exponent=1.1,
+    seed=0,
+    chunk_size=10_000,
+):
+    """Generate a deterministic catalog with Faker and bulk insert it.
+
+    The same arguments always produce the same rows. Pizza popularity follows
+    a Zipf law, so a few pizzas appear on most menus. Menu sizes are
+    log-normal around ``menu_mean``. Rows are inserted with chunked Core
+    ``insert()`` executemany calls, without building ORM objects.
+    Returns the number of rows inserted per table.
+    """
+    # Imported here so the app doesn't load Faker unless it is seeding
+    from faker import Faker
+
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+
+    # Ids continue after any rows already in the tables
+    first_restaurant = (db.session.query(db.func.max(Restaurant.id)).scalar() or 0) + 1
+    first_pizza = (db.session.query(db.func.max(Pizza.id)).scalar() or 0) + 1
+    restaurant_ids = range(first_restaurant, first_restaurant + restaurants)
+    pizza_ids = list(range(first_pizza, first_pizza + pizzas))
+
+    # Faker is slow per call, so draw from fixed pools of generated values
+    pool_size = min(max(restaurants, pizzas), FAKER_POOL_SIZE)
+    companies = [fake.company()[:40] for _ in range(pool_size)]
+    addresses = [fake.street_address() for _ in range(pool_size)]
+    words = [fake.word().title() for _ in range(pool_size)]
+
+    counts = {}
+    counts["restaurants"] = insert_chunks(
+        Restaurant.__table__,
+        (
+            {
+                "id": restaurant_id,
+                # The id suffix keeps names unique within the 50 character limit
+                "name": f"{rng.choice(companies)} {restaurant_id}",
+                "address": rng.choice(addresses),
+            }
+            for restaurant_id in restaurant_ids
+        ),
+        chunk_size,
+    )
+
+    base_prices = {}
+
+    def pizza_rows():
+        for pizza_id in pizza_ids:
+            base_prices[pizza_id] = rng.randint(8, 22)
+            toppings = rng.sample(INGREDIENTS, rng.randint(2, 6))
+            yield {
+                "id": pizza_id,
+                "name": f"{rng.choice(words)} {pizza_id}",
+                "ingredients": ", ".join(["Dough"] + toppings),
+            }
+
+    def link_ingredients(chunk):
+        # Core inserts skip the ORM events that keep pizza_ingredients in step
+        sync_ingredients(db.session.connection(), [(row["id"], row["ingredients"]) for row in chunk])
+
+    counts["pizzas"] = insert_chunks(Pizza.__table__, pizza_rows(), chunk_size, link_ingredients)
+
+    # Popularity ranks are shuffled so they don't follow the ids
+    ranked_pizzas = rng.sample(pizza_ids, len(pizza_ids))
+    cum_weights = zipf_cum_weights(len(ranked_pizzas), zipf_exponent)
+
+    def menu_rows():
+        for restaurant_id in restaurant_ids:
+            size = menu_size(rng, menu_mean, menu_sigma, len(pizza_ids))
+            for pizza_id in sorted(sample_menu(rng, ranked_pizzas, cum_weights, size)):
+                # Each restaurant prices within a few units of the pizza's base price
+                price = min(30, max(1, base_prices[pizza_id] + rng.randint(-3, 3)))
+                yield {"restaurant_id": restaurant_id, "pizza_id": pizza_id, "price": price}
+
+    counts["restaurant_pizzas"] = insert_chunks(RestaurantPizza.__table__, menu_rows(), chunk_size)
+
+    return counts
@@ -0,0 +1,228 @@
+"""Route logic shared by the WSGI resources (server/routes.py) and the ASGI
+handlers (server/asgi.py).
+
+Each handler is a generator taking the session it queries. It yields every
+database call it makes (``session.execute(...)``, ``session.commit()``...)
+and gets the call's result sent back, and its return value is the response.
+With ``db.session`` the calls have already run when they are yielded and
+:func:`run` just passes their results back; with an ``AsyncSession`` they
+are coroutines, which the ASGI app awaits. Queries, validations and
+responses are built once, here, for both. A handler that makes no database
+calls is a plain function returning its response.
+"""
+from inspect import isgenerator
+
+from flask import jsonify, make_response, request
+from sqlalchemy import delete, exists, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+
+from server.cache import invalidate
+from server.fieldsets import FieldsetError, apply_fieldset
+from server.filters import FilterError, filter_pizzas, filter_restaurant_pizzas
+from server.models import Pizza, Restaurant, RestaurantPizza
+from server.pagination import paginate
+from server.schema import (
+    pizza_schema,
+    pizzas_schema,
+    restaurant_detail_schema,
+    restaurantpizzas_schema,
+    restaurants_schema,
+    restaurants_with_stats_schema,
+)
+
+
+def run(handler):
+    """Drive a handler generator on ``db.session`` and return its response."""
+    if not isgenerator(handler):
+        return handler
+    try:
+        result = next(handler)
+        while True:
+            result = handler.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+def home(session):
+    # Create a response dictionary
+    response_dict = {"home": "Welcome to the Restaurant API."}
+
+    # Create an HTTP response with the dictionary and status code 200 (OK)
+    return make_response(response_dict, 200)
+
+
+def restaurants(session):
+    if request.args.get("include") == "stats":
+        # Join each restaurant's precomputed menu stats into the same query
+        query = select(Restaurant).options(joinedload(Restaurant.menu_stats))
+        return (yield from paginate(session, query, Restaurant, restaurants_with_stats_schema))
+
+    # Retrieve a page of restaurants and serialize it using the schema
+    return (yield from paginate(session, select(Restaurant), Restaurant, restaurants_schema))
+
+
+def restaurant_by_id(session, id):
+    try:
+        # Load and serialize only the requested fields
+        query, schema = apply_fieldset(select(Restaurant), Restaurant, restaurant_detail_schema)
+    except FieldsetError as e:
+        return make_response({"error": str(e)}, 400)
+
+    if "pizzas" in schema.dump_fields:
+        # Eager-load the menu so the nested pizzas cost one extra query
+        # however long the menu is
+        query = query.options(
+            selectinload(Restaurant.restaurant_pizzas).joinedload(RestaurantPizza.pizza)
+        )
+
+    # Retrieve a single restaurant by its ID
+    restaurant = (yield session.execute(query.filter_by(id=id))).scalars().first()
+    if restaurant:
+        # Serialize the restaurant and its menu using the detail schema
+        return make_response(schema.dump(restaurant), 200)
+
+    # If the restaurant with the specified ID doesn't exist, return a 404 response
+    response_dict = {"error": "Restaurant not found"}
+    return make_response(response_dict, 404)
+
+
+def delete_restaurant(session, id):
+    try:
+        # An index probe, not a load: whether the cascade empties a menu
+        on_menu = (yield session.execute(select(exists().where(RestaurantPizza.restaurant_id == id)))).scalar()
+
+        # One statement: ON DELETE CASCADE removes the menu entries and stats
+        deleted = (yield session.execute(delete(Restaurant).where(Restaurant.id == id))).rowcount
+        yield session.commit()
+
+        if deleted:
+            # Drop the cached responses built from the deleted rows
+            invalidate("Restaurant", f"Restaurant:{id}")
+            if on_menu:
+                invalidate("restaurant_pizzas")
+
+            response_dict = {"Message": "Restaurant deleted successfully!"}
+            return make_response(response_dict, 200)
+
+        response_dict = {"error": "Restaurant not found!"}
+        return make_response(response_dict, 404)
+
+    except Exception as e:
+        # Handle any exceptions that may occur during the deletion process
+        response_dict = {"error": str(e)}
+        return make_response(response_dict, 500)
+
+
+def pizzas(session):
+    # Narrow the pizzas by the ingredients they have (or don't)
+    query = filter_pizzas(select(Pizza))
+
+    # Retrieve a page of pizzas and serialize it using the schema
+    return (yield from paginate(session, query, Pizza, pizzas_schema))
+
+
+def pizza_by_id(session, id):
+    try:
+        # Load and serialize only the requested fields
+        query, schema = apply_fieldset(select(Pizza), Pizza, pizza_schema)
+    except FieldsetError as e:
+        return make_response({"error": str(e)}, 400)
+
+    pizza = (yield session.execute(query.filter_by(id=id))).scalars().first()
+
+    return make_response(schema.dump(pizza), 200)
+
+
+def delete_pizza(session, id):
+    try:
+        on_menu = (yield session.execute(select(exists().where(RestaurantPizza.pizza_id == id)))).scalar()
+
+        # One statement: ON DELETE CASCADE removes the menu entries and ingredient links
+        deleted = (yield session.execute(delete(Pizza).where(Pizza.id == id))).rowcount
+        yield session.commit()
+
+        if deleted:
+            # Drop the cached responses built from the deleted rows
+            invalidate("Pizza", f"Pizza:{id}")
+            if on_menu:
+                invalidate("restaurant_pizzas")
+
+            response_dict = {"Message": "Pizza deleted successfully!"}
+            return make_response(response_dict, 200)
+
+        response_dict = {"error": "Pizza not found!"}
+        return make_response(response_dict, 404)
+
+    except Exception as e:
+        response_dict = {"error": str(e)}
+        return make_response(response_dict, 500)
+
+
+def restaurant_pizzas(session):
+    try:
+        # Narrow and order the menu entries from the query parameters
+        query, sort = filter_restaurant_pizzas(select(RestaurantPizza))
+    except FilterError as e:
+        return make_response({"error": str(e)}, 400)
+
+    return (yield from paginate(session, query, RestaurantPizza, restaurantpizzas_schema, sort))
+
+
+def create_restaurant_pizza(session):
+    try:
+        # Parse form data from the request body
+        price = float(request.form.get("price"))
+        pizza_name = request.form.get("pizza_name")
+        restaurant_name = request.form.get("restaurant_name")
+
+        # Retrieve the associated Pizza and Restaurant by name
+        pizza = (yield session.execute(select(Pizza).filter_by(name=pizza_name))).scalars().first()
+        restaurant = (yield session.execute(select(Restaurant).filter_by(name=restaurant_name))).scalars().first()
+
+        # Check if the Pizza and Restaurant exist
+        if not pizza or not restaurant:
+            response_dict = {"errors": ["Pizza or Restaurant not found"]}
+            return make_response(jsonify(response_dict), 404)
+
+        # Create a new RestaurantPizza instance
+        restaurant_pizza = RestaurantPizza(
+            pizza_id=pizza.id, restaurant_id=restaurant.id, price=price
+        )
+
+        # Serialize the associated Pizza and Restaurant data
+        response_dict = {
+            "message": "Restaurant_pizza created successfully",
+            "pizza": {
+                "id": pizza.id,
+                "name": pizza.name,
+                "ingredients": pizza.ingredients,
+            },
+            "restaurant": {
+                "id": restaurant.id,
+                "name": restaurant.name,
+                "address": restaurant.address,
+            },
+        }
+
+        # Add and commit the new RestaurantPizza to the database
+        session.add(restaurant_pizza)
+        yield session.commit()
+        invalidate("restaurant_pizzas")
+
+        # The price as stored (a Numeric), not as parsed from the form
+        yield session.refresh(restaurant_pizza, ["price"])
+        response_dict["price"] = restaurant_pizza.price
+
+        return make_response(jsonify(response_dict), 201)  # Use 201 Created status code
+
+    except IntegrityError:
+        # A pizza can only be listed once per restaurant
+        yield session.rollback()
+        response_dict = {"errors": ["Pizza is already on this restaurant's menu"]}
+        return make_response(jsonify(response_dict), 409)
+
+    except Exception as e:
+        # Handle any exceptions that may occur during the creation process
+        response_dict = {"errors": ["An error occurred: " + str(e)]}
+        return make_response(jsonify(response_dict), 500)
@@ -0,0 +1,90 @@
+import logging
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger("server.requests")
+
+
+def record_timing(name, seconds):
+    # Accumulate a timing for the current request, if there is one
+    if has_request_context() and "timings" in g:
+        g.timings[name] = g.timings.get(name, 0.0) + seconds
+
+
+def instrument_engine(engine):
+    # Time every statement on ``engine`` into the current request's timings
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        if has_request_context() and "timings" in g:
+            g.timings["db"] += elapsed
+            g.timings["queries"] += 1
+
+
+def init_instrumentation(app, engine):
+    """Count SQL statements and time DB, serialization and handler work per
+    request, reported as a ``Server-Timing`` header and structured log fields.
+    """
+    if not app.config["SQL_INSTRUMENTATION_ENABLED"]:
+        return
+
+    instrument_engine(engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.timings = {"db": 0.0, "queries": 0, "serialize": 0.0}
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def emit_request_timings(response):
+        if "timings" not in g:
+            return response
+
+        timings, start = g.timings, g.request_start
+        response.headers["Server-Timing"] = server_timing(timings, start)
+        if not response.is_streamed:
+            log_request(request.endpoint, request.method, request.path, response.status_code, timings, start)
+            return response
+
+        # A streamed body runs its queries and serialization after this hook,
+        # so the header is marked partial and the log waits for the last chunk
+        response.headers["Server-Timing"] += ', partial;desc="streamed body not included"'
+        route, method, path = request.endpoint, request.method, request.path
+        response.call_on_close(
+            lambda: log_request(route, method, path, response.status_code, timings, start)
+        )
+        return response
+
+
+def server_timing(timings, start):
+    total = time.perf_counter() - start
+    return (
+        f'db;dur={timings["db"] * 1000:.2f};desc="{timings["queries"]} queries", '
+        f'serialize;dur={timings["serialize"] * 1000:.2f}, '
+        f"total;dur={total * 1000:.2f}"
+    )
+
+
+def log_request(route, method, path, status, timings, start):
+    total = time.perf_counter() - start
+    logger.info(
+        "%s %s %s",
+        method,
+        path,
+        status,
+        extra={
+            "route": route,
+            "method": method,
+            "status": status,
+            "db_queries": timings["queries"],
+            "db_ms": round(timings["db"] * 1000, 3),
+            "serialize_ms": round(timings["serialize"] * 1000, 3),
+            "total_ms": round(total * 1000, 3),
+        },
+    )
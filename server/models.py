@@ -1,6 +1,17 @@
 from server import db
+from sqlalchemy import DDL, event, inspect, select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import validates
 
+# Timestamps in the format SQLite's CURRENT_TIMESTAMP server defaults are
+# stored in, so datetimes bound in filters and cursors compare with them as
+# strings correctly (SQLAlchemy's default adds microseconds)
+Timestamp = db.DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
 
 
 class Restaurant(db.Model):
@@ -10,8 +21,13 @@ class Restaurant(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)
     address = db.Column(db.String, nullable=False)
 
+    # passive_deletes: the database's ON DELETE CASCADE removes the menu
+    # entries, so deleting a restaurant never loads its collections
     pizzas = db.relationship(
-        "Pizza", secondary="restaurant_pizzas", backref="Restaurant"
+        "Pizza",
+        secondary="restaurant_pizzas",
+        backref=db.backref("Restaurant", passive_deletes=True),
+        passive_deletes=True,
     )
 
     def __repr__(self):
@@ -31,41 +47,270 @@ class Pizza(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
     ingredients = db.Column(db.String, nullable=False)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, onupdate=db.func.now())
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, onupdate=db.func.now())
 
     restaurants = db.relationship(
-        "Restaurant", secondary="restaurant_pizzas", backref="Pizza"
+        "Restaurant",
+        secondary="restaurant_pizzas",
+        backref=db.backref("Pizza", passive_deletes=True),
+        passive_deletes=True,
     )
 
     def __repr__(self):
         return f"{self.name} {self.ingredients} {self.created_at} {self.updated_at}"
 
 
+class Ingredient(db.Model):
+    __tablename__ = "Ingredient"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # NOCASE: "cheese" and "Cheese" are the same ingredient, in lookups and in the unique index
+    name = db.Column(db.String(50, collation="NOCASE"), unique=True, nullable=False)
+
+    def __repr__(self):
+        return f"{self.name}"
+
+
+# Which ingredients each pizza has, parsed from Pizza.ingredients. The primary
+# key serves "ingredients of a pizza", the second index "pizzas with an ingredient".
+pizza_ingredients = db.Table(
+    "pizza_ingredients",
+    db.Column("pizza_id", db.Integer, db.ForeignKey("Pizza.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("ingredient_id", db.Integer, db.ForeignKey("Ingredient.id", ondelete="CASCADE"), primary_key=True),
+    db.Index("ix_pizza_ingredients_ingredient_id_pizza_id", "ingredient_id", "pizza_id"),
+)
+
+
+def parse_ingredients(text):
+    # "Dough, Tomato  Sauce, dough" -> ["Dough", "Tomato Sauce"]; the first spelling wins
+    names = {}
+    for part in (text or "").split(","):
+        name = " ".join(part.split())[:50]
+        if name:
+            names.setdefault(name.lower(), name)
+    return list(names.values())
+
+
+def sync_ingredients(connection, pizzas):
+    """Rebuild the pizza_ingredients rows of ``pizzas``, ``(id, ingredients)`` pairs.
+
+    Set-based: one insert for any new ingredient names, one lookup, one
+    delete and one executemany insert, however many pizzas are passed.
+    """
+    parsed = [(pizza_id, parse_ingredients(text)) for pizza_id, text in pizzas]
+    names = {name for _, pizza_names in parsed for name in pizza_names}
+
+    if names:
+        connection.execute(
+            sqlite_insert(Ingredient).on_conflict_do_nothing(),
+            [{"name": name} for name in names],
+        )
+        ids = {
+            name.lower(): ingredient_id
+            for ingredient_id, name in connection.execute(
+                select(Ingredient.id, Ingredient.name).where(Ingredient.name.in_(names))
+            )
+        }
+
+    connection.execute(
+        pizza_ingredients.delete().where(pizza_ingredients.c.pizza_id.in_([pizza_id for pizza_id, _ in parsed]))
+    )
+    links = [
+        {"pizza_id": pizza_id, "ingredient_id": ids[name.lower()]}
+        for pizza_id, pizza_names in parsed
+        for name in pizza_names
+    ]
+    if links:
+        connection.execute(pizza_ingredients.insert(), links)
+
+
+# Pizzas written through the ORM keep their ingredient rows in step with the
+# ingredients string; Core inserts (the seed generator) call sync_ingredients()
+@event.listens_for(Pizza, "after_insert")
+def link_new_pizza_ingredients(mapper, connection, pizza):
+    sync_ingredients(connection, [(pizza.id, pizza.ingredients)])
+
+
+@event.listens_for(Pizza, "after_update")
+def relink_pizza_ingredients(mapper, connection, pizza):
+    if inspect(pizza).attrs.ingredients.history.has_changes():
+        sync_ingredients(connection, [(pizza.id, pizza.ingredients)])
+
+
 class RestaurantPizza(db.Model):
     __tablename__ = "restaurant_pizzas"
+    # The composite indexes lead with each foreign key, so they also serve
+    # lookups and deletes by restaurant_id or pizza_id alone
+    __table_args__ = (
+        db.Index(
+            "ix_restaurant_pizzas_restaurant_id_pizza_id",
+            "restaurant_id",
+            "pizza_id",
+            unique=True,
+        ),
+        db.Index("ix_restaurant_pizzas_pizza_id_price", "pizza_id", "price"),
+        # Price ranges and price order within a restaurant
+        db.Index("ix_restaurant_pizzas_restaurant_id_price", "restaurant_id", "price"),
+        # Price ranges, created_after and the sort=price / sort=created_at orders
+        db.Index("ix_restaurant_pizzas_price", "price"),
+        db.Index("ix_restaurant_pizzas_created_at", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     price = db.Column(db.Numeric(10, 2), nullable=False)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, onupdate=db.func.now())
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, onupdate=db.func.now())
 
     restaurant_id = db.Column(
-        db.Integer, db.ForeignKey("Restaurant.id"), nullable=False
+        db.Integer, db.ForeignKey("Restaurant.id", ondelete="CASCADE"), nullable=False
     )
     restaurant = db.relationship(
-        "Restaurant", backref=db.backref("restaurant_pizzas", lazy=True)
+        "Restaurant", backref=db.backref("restaurant_pizzas", lazy=True, passive_deletes=True)
     )
 
-    pizza_id = db.Column(db.Integer, db.ForeignKey("Pizza.id"), nullable=False)
-    pizza = db.relationship("Pizza", backref=db.backref("restaurant_pizzas", lazy=True))
+    pizza_id = db.Column(db.Integer, db.ForeignKey("Pizza.id", ondelete="CASCADE"), nullable=False)
+    pizza = db.relationship("Pizza", backref=db.backref("restaurant_pizzas", lazy=True, passive_deletes=True))
 
     def __repr__(self):
         return f"<RestaurantPizza {self.restaurant.name} - {self.pizza.name}>"
     
     @validates('price')
     def validate_price(self, key, price):
-        if price not in range(1, 31):
-            raise ValueError("Price must be between 1 and 30.")
-        else:
-            return price
\ No newline at end of file
+        return check_price(price)
+
+
+# Shared by the model validator and the bulk ingest, which bypasses the ORM
+def check_price(price):
+    if price not in range(1, 31):
+        raise ValueError("Price must be between 1 and 30.")
+    else:
+        return price
+
+
+class RestaurantMenuStats(db.Model):
+    """Precomputed size and price range of one restaurant's menu.
+
+    Maintained by the SQLite triggers below on every restaurant_pizzas write,
+    so reading it never aggregates the menu. Restaurants with an empty menu
+    have no row. ``flask stats rebuild`` recomputes every row from scratch.
+    """
+
+    __tablename__ = "restaurant_menu_stats"
+
+    restaurant_id = db.Column(
+        db.Integer, db.ForeignKey("Restaurant.id", ondelete="CASCADE"), primary_key=True
+    )
+    pizza_count = db.Column(db.Integer, nullable=False)
+    # The average is derived from the running total, which updates in O(1)
+    price_total = db.Column(db.Numeric(12, 2), nullable=False)
+    price_min = db.Column(db.Numeric(10, 2))
+    price_max = db.Column(db.Numeric(10, 2))
+
+    restaurant = db.relationship(
+        "Restaurant", backref=db.backref("menu_stats", uselist=False, lazy=True, viewonly=True), viewonly=True
+    )
+
+    @property
+    def price_avg(self):
+        if not self.pizza_count:
+            return None
+        return self.price_total / self.pizza_count
+
+    def __repr__(self):
+        return f"<RestaurantMenuStats {self.restaurant_id}: {self.pizza_count} pizzas>"
+
+
+# Add a menu entry to its restaurant's stats
+_MENU_STATS_ADD = (
+    "INSERT INTO restaurant_menu_stats (restaurant_id, pizza_count, price_total, price_min, price_max) "
+    "VALUES (new.restaurant_id, 1, new.price, new.price, new.price) "
+    "ON CONFLICT (restaurant_id) DO UPDATE SET "
+    "pizza_count = pizza_count + 1, "
+    "price_total = price_total + excluded.price_total, "
+    "price_min = min(price_min, excluded.price_min), "
+    "price_max = max(price_max, excluded.price_max); "
+)
+
+# Take one away. Only removing the current min or max needs a new one, read
+# off ix_restaurant_pizzas_restaurant_id_price; an emptied menu loses its row.
+_MENU_STATS_REMOVE = (
+    "UPDATE restaurant_menu_stats SET "
+    "pizza_count = pizza_count - 1, "
+    "price_total = price_total - old.price, "
+    "price_min = CASE WHEN old.price > price_min THEN price_min ELSE "
+    "(SELECT min(price) FROM restaurant_pizzas WHERE restaurant_id = old.restaurant_id) END, "
+    "price_max = CASE WHEN old.price < price_max THEN price_max ELSE "
+    "(SELECT max(price) FROM restaurant_pizzas WHERE restaurant_id = old.restaurant_id) END "
+    "WHERE restaurant_id = old.restaurant_id; "
+    "DELETE FROM restaurant_menu_stats WHERE restaurant_id = old.restaurant_id AND pizza_count <= 0; "
+)
+
+MENU_STATS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS restaurant_menu_stats_insert AFTER INSERT ON restaurant_pizzas BEGIN "
+    f"{_MENU_STATS_ADD}END",
+    "CREATE TRIGGER IF NOT EXISTS restaurant_menu_stats_delete AFTER DELETE ON restaurant_pizzas BEGIN "
+    f"{_MENU_STATS_REMOVE}END",
+    "CREATE TRIGGER IF NOT EXISTS restaurant_menu_stats_update AFTER UPDATE OF restaurant_id, price ON restaurant_pizzas BEGIN "
+    f"{_MENU_STATS_REMOVE}{_MENU_STATS_ADD}END",
+)
+
+for _statement in MENU_STATS_TRIGGERS:
+    event.listen(db.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+# Per-table change counters, bumped by SQLite triggers on every insert, update
+# and delete (including Core and bulk statements that skip ORM events)
+table_versions = db.Table(
+    "table_versions",
+    db.Column("table_name", db.String(50), primary_key=True),
+    db.Column("version", db.Integer, nullable=False, server_default="0"),
+)
+
+VERSIONED_TABLES = ("Restaurant", "Pizza", "restaurant_pizzas")
+
+
+def version_trigger_ddl(table_name):
+    for operation in ("INSERT", "UPDATE", "DELETE"):
+        yield (
+            f'CREATE TRIGGER IF NOT EXISTS "{table_name}_version_{operation.lower()}" '
+            f'AFTER {operation} ON "{table_name}" BEGIN '
+            f"INSERT INTO table_versions (table_name, version) VALUES ('{table_name}', 1) "
+            "ON CONFLICT (table_name) DO UPDATE SET version = version + 1; "
+            "END"
+        )
+
+
+# Migrations create the triggers on real databases; this covers create_all()
+for _table_name in VERSIONED_TABLES:
+    for _statement in version_trigger_ddl(_table_name):
+        event.listen(db.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+# Full-text index over pizza names and ingredients. It is an external content
+# table: the text lives only in "Pizza", and the triggers below keep the index
+# in step with every write, including Core and bulk statements. Prefix indexes
+# on 2 and 3 characters keep short prefix queries from scanning the term list.
+PIZZA_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pizza_fts USING fts5("
+    "name, ingredients, content='Pizza', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    # Name matches outrank ingredient matches
+    "INSERT INTO pizza_fts (pizza_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    'CREATE TRIGGER IF NOT EXISTS pizza_fts_insert AFTER INSERT ON "Pizza" BEGIN '
+    "INSERT INTO pizza_fts (rowid, name, ingredients) VALUES (new.id, new.name, new.ingredients); "
+    "END",
+    'CREATE TRIGGER IF NOT EXISTS pizza_fts_delete AFTER DELETE ON "Pizza" BEGIN '
+    "INSERT INTO pizza_fts (pizza_fts, rowid, name, ingredients) VALUES ('delete', old.id, old.name, old.ingredients); "
+    "END",
+    'CREATE TRIGGER IF NOT EXISTS pizza_fts_update AFTER UPDATE OF name, ingredients ON "Pizza" BEGIN '
+    "INSERT INTO pizza_fts (pizza_fts, rowid, name, ingredients) VALUES ('delete', old.id, old.name, old.ingredients); "
+    "INSERT INTO pizza_fts (rowid, name, ingredients) VALUES (new.id, new.name, new.ingredients); "
+    "END",
+)
+
+for _statement in PIZZA_FTS_DDL:
+    event.listen(db.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+# drop_all() doesn't know about the index; without this a later create_all()
+# would keep its stale entries
+event.listen(db.metadata, "before_drop", DDL("DROP TABLE IF EXISTS pizza_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,166 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request
+from sqlalchemy import literal, tuple_
+
+from server.fieldsets import FieldsetError, apply_fieldset
+from server.serializers import dump_many, result_rows, select_for
+from server.streaming import stream_json_array
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(last_id, key=None):
+    # Opaque cursor: url-safe base64 of the last id (and sort key) the client has seen
+    data = {"id": last_id} if key is None else {"id": last_id, "key": key}
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort_column=None):
+    """Return the ``(id, key)`` a cursor was built from.
+
+    ``key`` is converted back to ``sort_column``'s Python type, or is None
+    for the default id order.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if sort_column is None:
+            return int(data["id"]), None
+        python_type = sort_column.type.python_type
+        if python_type is datetime:
+            return int(data["id"]), datetime.fromisoformat(data["key"])
+        return int(data["id"]), python_type(data["key"])
+    except (binascii.Error, UnicodeError, ArithmeticError, ValueError, KeyError, TypeError):
+        raise PaginationError("Invalid cursor")
+
+
+def order_rows(query, model, sort):
+    # Sort column first, id as the tie-breaker, both in the same direction
+    if sort is None:
+        return query.order_by(model.id)
+    column, descending = sort
+    if descending:
+        return query.order_by(column.desc(), model.id.desc())
+    return query.order_by(column, model.id)
+
+
+def after_cursor(query, model, sort, cursor):
+    # Keyset condition: rows strictly after the cursor in the sort order
+    if sort is None:
+        last_id, _ = decode_cursor(cursor)
+        return query.filter(model.id > last_id)
+    column, descending = sort
+    last_id, key = decode_cursor(cursor, column)
+    position = tuple_(column, model.id)
+    # Bind the key with the column's own type so it is stored-format compatible
+    last = tuple_(literal(key, column.type), last_id)
+    if descending:
+        return query.filter(position < last)
+    return query.filter(position > last)
+
+
+def cursor_for(row, sort):
+    if sort is None:
+        return encode_cursor(row.id)
+    column, _ = sort
+    return encode_cursor(row.id, getattr(row, column.key))
+
+
+def parse_limit(value):
+    if value is None:
+        return current_app.config["PAGINATION_DEFAULT_LIMIT"]
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be greater than 0")
+    # Clamp to the configured page size so a client can't ask for the whole table
+    return min(limit, current_app.config["PAGINATION_MAX_LIMIT"])
+
+
+def prepare_page(query, model, schema, sort=None):
+    """Build the query for the page the request asks for.
+
+    Returns ``(query, schema, limit)``: the query narrowed to ``?fields=``,
+    past the cursor and ordered, the narrowed schema, and the number of rows
+    the page holds (fetch one more to learn whether another page follows).
+    ``limit`` is None for ``stream=true``, where every row is wanted.
+    Raises PaginationError or FieldsetError on bad parameters.
+    """
+    limit_arg = request.args.get("limit")
+    after_arg = request.args.get("after")
+    stream = request.args.get("stream", "").lower() in ("1", "true")
+
+    # The cursor needs the sort column even when the client didn't ask for it
+    required = (model.id,) if sort is None else (model.id, sort[0])
+
+    # Only the requested fields are selected and serialized
+    query, schema = apply_fieldset(query, model, schema, required)
+
+    # Plain column tuples instead of ORM objects when the route uses compiled serializers
+    query = select_for(query, model, schema, required)
+
+    if after_arg is not None:
+        query = after_cursor(query, model, sort, after_arg)
+    query = order_rows(query, model, sort)
+
+    if stream:
+        return query, schema, None
+    if limit_arg is None and after_arg is None:
+        return query, schema, current_app.config["PAGINATION_SAFETY_CAP"]
+    return query, schema, parse_limit(limit_arg)
+
+
+def page_response(items, schema, sort, limit):
+    """The list response for ``items``, fetched with ``limit + 1`` rows."""
+    page = items[:limit]
+    more = len(items) > limit
+
+    if "limit" not in request.args and "after" not in request.args:
+        response = make_response(dump_many(schema, page), 200)
+        if more:
+            # Same filters, sort and fields, continuing after the last row
+            args = request.args.to_dict()
+            args["limit"] = current_app.config["PAGINATION_MAX_LIMIT"]
+            args["after"] = cursor_for(page[-1], sort)
+            response.headers["Link"] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+        return response
+
+    next_cursor = cursor_for(page[-1], sort) if more else None
+
+    return make_response({"data": dump_many(schema, page), "next": next_cursor}, 200)
+
+
+def paginate(session, query, model, schema, sort=None):
+    """Keyset-paginate ``query`` and build the list response.
+
+    Rows are ordered by ``model.id``, or by ``sort``, a ``(column,
+    descending)`` pair, with the id breaking ties.
+    Without ``limit``/``after`` the README's plain array is returned, capped at
+    ``PAGINATION_SAFETY_CAP`` rows with a ``Link`` header pointing at the rest.
+    With ``stream=true`` every row (after the optional cursor) is streamed
+    as one uncapped JSON array instead.
+
+    A handler generator (see server/handlers.py): it yields the page query
+    run on ``session`` and returns the response.
+    """
+    try:
+        query, schema, limit = prepare_page(query, model, schema, sort)
+    except (PaginationError, FieldsetError) as e:
+        return make_response({"error": str(e)}, 400)
+
+    if limit is None:
+        return stream_json_array(session, query, schema)
+
+    # Fetch one extra row to know whether there is a next page
+    result = yield session.execute(query.limit(limit + 1))
+    return page_response(result_rows(result, schema), schema, sort, limit)
@@ -1,17 +1,33 @@
 from flask import  make_response, request, jsonify
 from flask_restful import  Resource
-from server import db ,api
-from server.schema import restaurants_schema, restaurant_schema, pizzas_schema, pizza_schema, restaurantpizzas_schema
+from sqlalchemy.orm import joinedload
+from server import db ,api, handlers
+from server.schema import menu_stats_schema, stats_for, pizzas_schema
+from server.analytics import price_analytics
+from server.batch import batch_response
+from server.bulk import (
+    PIZZA_DELETE_FILTERS,
+    RESTAURANT_DELETE_FILTERS,
+    BulkError,
+    bulk_delete,
+    insert_chunk,
+    iter_chunks,
+    iter_records,
+    parse_chunk_size,
+)
+from server.cache import cached, invalidate
+from server.etag import conditional
+from server.export import FIELDNAMES, export_response
+from server.fieldsets import FieldsetError, requested_fields
+from server.handlers import run
 from server.models import Pizza, Restaurant, RestaurantPizza
+from server.search import search_pizzas
 
 # Define a Resource for the home route ("/")
 class Home(Resource):
+    @conditional()
     def get(self):
-        # Create a response dictionary
-        response_dict = {"home": "Welcome to the Restaurant API."}
-
-        # Create an HTTP response with the dictionary and status code 200 (OK)
-        response = make_response(response_dict, 200)
+        response = run(handlers.home(db.session))
 
         return response
 
@@ -19,11 +35,18 @@ class Home(Resource):
 
 # Define a Resource for the "/restaurants" route
 class Restaurants(Resource):
+    # include=stats reads restaurant_menu_stats, which every menu write changes
+    @conditional("Restaurant", "restaurant_pizzas")
+    @cached("Restaurant", "restaurant_pizzas")
     def get(self):
-        # Retrieve all restaurants from the database
-        restaurants = Restaurant.query.all()
-        # Serialize the restaurants using the schema
-        response = make_response(restaurants_schema.dump(restaurants), 200)
+        # A page of restaurants, with their menu stats on include=stats
+        response = run(handlers.restaurants(db.session))
+
+        return response
+
+    def delete(self):
+        # Every restaurant matching the body's ids or filter, in bounded chunks
+        response = bulk_delete(Restaurant, RestaurantPizza.restaurant_id, RESTAURANT_DELETE_FILTERS)
 
         return response
 
@@ -31,164 +54,173 @@ class Restaurants(Resource):
 
 # Define a Resource for the "/restaurants/<int:id>" route
 class RestaurantByID(Resource):
+    @conditional("Restaurant", "restaurant_pizzas", "Pizza")
+    @cached("Restaurant:{id}", "restaurant_pizzas")
     def get(self, id):
-        # Retrieve a single restaurant by its ID
-        restaurant = Restaurant.query.filter_by(id=id).first()
+        # One restaurant, with its menu unless ?fields= leaves it out
+        response = run(handlers.restaurant_by_id(db.session, id))
+
+        return response
+
+    def delete(self, id):
+        # The restaurant, its menu entries and its stats, in one statement
+        response = run(handlers.delete_restaurant(db.session, id))
+
+        return response
+
+
+
+
+class RestaurantStats(Resource):
+    @conditional("Restaurant", "restaurant_pizzas")
+    @cached("Restaurant:{id}", "restaurant_pizzas")
+    def get(self, id):
+        # One primary-key lookup; the stats are kept up to date by triggers
+        restaurant = Restaurant.query.options(joinedload(Restaurant.menu_stats)).filter_by(id=id).first()
         if restaurant:
-            # Serialize the restaurant using the schema for a single object
-            response = make_response(restaurant_schema.dump(restaurant), 200)
+            response = make_response(menu_stats_schema.dump(stats_for(restaurant)), 200)
         else:
-            # If the restaurant with the specified ID doesn't exist, return a 404 response
             response_dict = {"error": "Restaurant not found"}
             response = make_response(response_dict, 404)
 
         return response
 
-    def delete(self, id):
-        try:
-            restaurant = Restaurant.query.filter_by(id=id).first()
 
-            if restaurant:
-                # Delete associated records in the RestaurantPizza
-                RestaurantPizza.query.filter_by(restaurant_id=id).delete()
 
-                # Delete the restaurant from the database
-                db.session.delete(restaurant)
-                db.session.commit()
+class Pizzas(Resource):
+    @conditional("Pizza")
+    @cached("Pizza")
+    def get(self):
+        # A page of pizzas, narrowed by the ingredients they have (or don't)
+        response = run(handlers.pizzas(db.session))
 
-                response_dict = {"Message": "Restaurant deleted successfully!"}
+        return response
 
-                response = make_response(response_dict, 200)
+    def delete(self):
+        # Every pizza matching the body's ids or filter, in bounded chunks
+        response = bulk_delete(Pizza, RestaurantPizza.pizza_id, PIZZA_DELETE_FILTERS)
 
-            else:
-                response_dict = {"error": "Restaurant not found!"}
+        return response
 
-                response = make_response(response_dict, 404)
+class PizzaSearch(Resource):
+    @conditional("Pizza")
+    @cached("Pizza")
+    def get(self):
+        # Full-text search over pizza names and ingredients, best matches first
+        response = search_pizzas(pizzas_schema)
 
-        except Exception as e:
-            # Handle any exceptions that may occur during the deletion process
-            response_dict = {"error": str(e)}
+        return response
 
-            response = make_response(response_dict, 500)
+class PizzaByID(Resource):
+    @conditional("Pizza")
+    @cached("Pizza:{id}")
+    def get(self, id):
+        response = run(handlers.pizza_by_id(db.session, id))
 
         return response
 
+    def delete(self, id):
+        # The pizza, its menu entries and its ingredient links, in one statement
+        response = run(handlers.delete_pizza(db.session, id))
 
+        return response
 
 
-class Pizzas(Resource):
+class RestaurantPizzas(Resource):
+    @conditional("restaurant_pizzas")
+    @cached("restaurant_pizzas")
     def get(self):
-        # Retrieve all pizzas from the database
-        pizza = Pizza.query.all()
-        # Serialize the pizzas using the schema
-        response = make_response(pizzas_schema.dump(pizza), 200)
+        # A page of menu entries, narrowed and ordered from the query parameters
+        response = run(handlers.restaurant_pizzas(db.session))
 
         return response
 
-class PizzaByID(Resource):
-    def get(self, id):
-        response_dict = Pizza.query.filter_by(id=id).first()
-
-        response = make_response(pizza_schema.dump(response_dict), 200)
+    def post(self):
+        # Add a pizza to a restaurant's menu, both looked up by name
+        response = run(handlers.create_restaurant_pizza(db.session))
 
         return response
 
-    def delete(self, id):
+
+class RestaurantPizzasBulk(Resource):
+    def post(self):
         try:
-            pizza = Pizza.query.filter_by(id=id).first()
+            chunk_size = parse_chunk_size(request.args.get("chunk_size"))
 
-            if pizza:
-                # Delete associated records in the RestaurantPizza
-                RestaurantPizza.query.filter_by(pizza_id=id).delete()
+            inserted, errors = 0, []
+            # Each chunk is resolved, validated and inserted in its own transaction
+            for chunk in iter_chunks(iter_records(), chunk_size):
+                chunk_inserted, chunk_errors = insert_chunk(chunk)
+                inserted += chunk_inserted
+                errors.extend(chunk_errors)
+                if chunk_inserted:
+                    invalidate("restaurant_pizzas")
 
-                # Delete the pizza from the database
-                db.session.delete(pizza)
-                db.session.commit()
+        except BulkError as e:
+            response_dict = {"errors": [str(e)]}
+            return make_response(jsonify(response_dict), 400)
 
-                response_dict = {"Message": "Pizza deleted successfully!"}
+        response_dict = {"inserted": inserted, "failed": len(errors), "errors": errors}
 
-                response = make_response(response_dict, 200)
+        # 207 Multi-Status when some rows were rejected
+        return make_response(jsonify(response_dict), 207 if errors else 201)
 
-            else:
-                response_dict = {"error": "Pizza not found!"}
 
-                response = make_response(response_dict, 404)
+class RestaurantPizzasExport(Resource):
+    @conditional("restaurant_pizzas", "Restaurant", "Pizza")
+    def get(self, format):
+        # Stream every menu entry joined with its restaurant and pizza
+        compress = request.args.get("gzip", "").lower() in ("1", "true")
 
-        except Exception as e:
-            response_dict = {"error": str(e)}
+        try:
+            # Select and write only the requested columns
+            fields = requested_fields(FIELDNAMES)
+        except FieldsetError as e:
+            return make_response({"error": str(e)}, 400)
 
-            response = make_response(response_dict, 500)
+        response = export_response(format, compress, fields)
 
         return response
 
 
-class RestaurantPizzas(Resource):
+class PriceAnalytics(Resource):
+    @conditional("restaurant_pizzas")
+    @cached("restaurant_pizzas")
     def get(self):
-        restaurantpizza = RestaurantPizza.query.all()
-
-        response = make_response(restaurantpizzas_schema.dump(restaurantpizza), 200)
+        # Percentiles, histograms and per-group price spreads from the in-memory price columns
+        response = price_analytics()
 
         return response
 
+
+class Batch(Resource):
     def post(self):
-        try:
-            # Parse form data from the request body
-            price = float(request.form.get("price"))
-            pizza_name = request.form.get("pizza_name")
-            restaurant_name = request.form.get("restaurant_name")
-
-            # Retrieve the associated Pizza and Restaurant by name
-            pizza = Pizza.query.filter_by(name=pizza_name).first()
-            restaurant = Restaurant.query.filter_by(name=restaurant_name).first()
-
-            # Check if the Pizza and Restaurant exist
-            if not pizza or not restaurant:
-                response_dict = {"errors": ["Pizza or Restaurant not found"]}
-                return make_response(jsonify(response_dict), 404)
-
-            # Create a new RestaurantPizza instance
-            restaurant_pizza = RestaurantPizza(
-                pizza_id=pizza.id, restaurant_id=restaurant.id, price=price
-            )
-
-            # Add and commit the new RestaurantPizza to the database
-            db.session.add(restaurant_pizza)
-            db.session.commit()
-
-            # Serialize and return the associated Pizza data
-            response_dict = {
-                "message": "Restaurant_pizza created successfully",
-                "pizza": {
-                    "id": pizza.id,
-                    "name": pizza.name,
-                    "ingredients": pizza.ingredients,
-                },
-                "restaurant": {
-                    "id": restaurant.id,
-                    "name": restaurant.name,
-                    "address": restaurant.address,
-                },
-                "price": restaurant_pizza.price,
-            }
-
-            response = make_response(jsonify(response_dict), 201)  # Use 201 Created status code
-
-        except Exception as e:
-            # Handle any exceptions that may occur during the creation process
-            response_dict = {"errors": ["An error occurred: " + str(e)]}
-            return make_response(jsonify(response_dict), 500)
+        # Run every sub-request in-process on one session, in order
+        response = batch_response()
 
         return response
 
 
 # Add the Home resource to handle the root ("/") route
 api.add_resource(Home, "/")
+# Add the Batch resource to handle the "/batch" route
+api.add_resource(Batch, "/batch")
+# Add the PriceAnalytics resource to handle the "/analytics/prices" route
+api.add_resource(PriceAnalytics, "/analytics/prices")
 # Add the RestaurantPizza resource to handle the route '/restaurantspizza'
 api.add_resource(RestaurantPizzas, "/restaurantspizza")
+# Add the RestaurantPizzasBulk resource to handle the route '/restaurantspizza/bulk'
+api.add_resource(RestaurantPizzasBulk, "/restaurantspizza/bulk")
+# Add the RestaurantPizzasExport resource to handle '/export/restaurantspizza.ndjson' and '.csv'
+api.add_resource(RestaurantPizzasExport, "/export/restaurantspizza.<any(ndjson, csv):format>")
+# Add the PizzaSearch resource to handle the "/pizzas/search" route
+api.add_resource(PizzaSearch, "/pizzas/search")
 # Add the PizzaByID resource to handle the "/pizzas/<int:id>" route
 api.add_resource(PizzaByID, "/pizzas/<int:id>")
 # Add the RestaurantByID resource to handle the "/restaurants/<int:id>" route
 api.add_resource(RestaurantByID, "/restaurants/<int:id>")
+# Add the RestaurantStats resource to handle the "/restaurants/<int:id>/stats" route
+api.add_resource(RestaurantStats, "/restaurants/<int:id>/stats")
 # Add the Restaurants resource to handle the "/restaurants" route
 api.add_resource(Restaurants, "/restaurants")
 # Add the Pizzas resource to handle the "/pizzas" route
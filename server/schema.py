@@ -1,7 +1,21 @@
+import time
+
 from server import ma
-from server.models import Restaurant, Pizza, RestaurantPizza
+from server.instrumentation import record_timing
+from server.models import Restaurant, Pizza, RestaurantMenuStats, RestaurantPizza
+
+
+# Reports the time spent dumping to the request's Server-Timing header
+class TimedSchema(ma.SQLAlchemySchema):
+    def dump(self, obj, *, many=None):
+        start = time.perf_counter()
+        try:
+            return super().dump(obj, many=many)
+        finally:
+            record_timing("serialize", time.perf_counter() - start)
 
-class RestaurantSchema(ma.SQLAlchemySchema):
+
+class RestaurantSchema(TimedSchema):
     class Meta:
         model = Restaurant
 
@@ -15,7 +29,55 @@ restaurant_schema = RestaurantSchema()
 restaurants_schema = RestaurantSchema(many=True)
 
 
-class PizzaSchema(ma.SQLAlchemySchema):
+# Precomputed menu size and prices; prices as decimal strings like menu prices
+class MenuStatsSchema(ma.Schema):
+    restaurant_id = ma.Integer()
+    pizza_count = ma.Integer()
+    price_min = ma.Decimal(places=2, as_string=True)
+    price_max = ma.Decimal(places=2, as_string=True)
+    price_avg = ma.Decimal(places=2, as_string=True)
+
+
+# Create instances of the menu stats schema, standalone and nested in a restaurant
+menu_stats_schema = MenuStatsSchema()
+nested_menu_stats_schema = MenuStatsSchema(exclude=("restaurant_id",))
+
+
+def stats_for(restaurant):
+    # Restaurants with an empty menu have no stats row; report them as empty
+    return restaurant.menu_stats or RestaurantMenuStats(
+        restaurant_id=restaurant.id, pizza_count=0, price_total=0
+    )
+
+
+class RestaurantWithStatsSchema(RestaurantSchema):
+    stats = ma.Method("dump_stats")
+
+    def dump_stats(self, restaurant):
+        return nested_menu_stats_schema.dump(stats_for(restaurant))
+
+
+# Create an instance of the Restaurant schema with menu stats for /restaurants?include=stats
+restaurants_with_stats_schema = RestaurantWithStatsSchema(many=True)
+
+
+# A pizza as it appears on one restaurant's menu, dumped from a RestaurantPizza row
+class MenuItemSchema(ma.Schema):
+    id = ma.Integer(attribute="pizza.id")
+    name = ma.String(attribute="pizza.name")
+    ingredients = ma.String(attribute="pizza.ingredients")
+    price = ma.Decimal()
+
+
+class RestaurantDetailSchema(RestaurantSchema):
+    pizzas = ma.Nested(MenuItemSchema, many=True, attribute="restaurant_pizzas")
+
+
+# Create an instance of the Restaurant detail schema (restaurant with its menu)
+restaurant_detail_schema = RestaurantDetailSchema()
+
+
+class PizzaSchema(TimedSchema):
     class Meta:
         model = Pizza
 
@@ -31,7 +93,7 @@ pizza_schema = PizzaSchema()
 pizzas_schema = PizzaSchema(many=True)
 
 
-class RestaurantPizzaSchema(ma.SQLAlchemySchema):
+class RestaurantPizzaSchema(TimedSchema):
     class Meta:
         model = RestaurantPizza
 
@@ -0,0 +1,69 @@
+import re
+
+from flask import make_response, request
+from sqlalchemy import Float, Integer, column, literal_column, select, table, tuple_
+
+from server.fieldsets import FieldsetError, apply_fieldset
+from server.models import Pizza
+from server.pagination import PaginationError, decode_cursor, encode_cursor, parse_limit
+
+# The FTS5 index from server/models.py. It isn't in the metadata, so
+# create_all() never tries to build it as a plain table.
+pizza_fts = table("pizza_fts", column("rowid", Integer), column("rank", Float))
+
+
+class SearchError(ValueError):
+    pass
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query that matches every word as a prefix.
+
+    Each word is quoted, so FTS5 operators and column filters in the input
+    are matched literally instead of being interpreted.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        raise SearchError("q must contain at least one word")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_pizzas(schema):
+    """Rank pizzas matching ``?q=`` by bm25 and return one keyset page.
+
+    Pages are ordered by (rank, id), and the cursor carries both. bm25 has to
+    score every match, so a query matching a large share of the catalog costs
+    time in proportion to its matches; selective queries stay in milliseconds.
+    """
+    rank = pizza_fts.c.rank
+    after_arg = request.args.get("after")
+
+    try:
+        match = match_expression(request.args.get("q"))
+        limit = parse_limit(request.args.get("limit"))
+
+        # Only the requested fields are selected and serialized
+        query, schema = apply_fieldset(Pizza.query, Pizza, schema)
+
+        # Rank and page inside the index, then load just the page's pizzas
+        matches = select(pizza_fts.c.rowid, rank).where(literal_column("pizza_fts").op("MATCH")(match))
+        if after_arg is not None:
+            last_id, last_rank = decode_cursor(after_arg, rank)
+            matches = matches.where(tuple_(rank, pizza_fts.c.rowid) > tuple_(last_rank, last_id))
+        # Fetch one extra row to know whether there is a next page
+        matches = matches.order_by(rank, pizza_fts.c.rowid).limit(limit + 1).subquery()
+
+        rows = (
+            query.join(matches, matches.c.rowid == Pizza.id)
+            .add_columns(matches.c.rank)
+            .order_by(matches.c.rank, Pizza.id)
+            .all()
+        )
+
+    except (SearchError, PaginationError, FieldsetError) as e:
+        return make_response({"error": str(e)}, 400)
+
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1][0].id, page[-1][1]) if len(rows) > limit else None
+
+    return make_response({"data": schema.dump([pizza for pizza, _ in page]), "next": next_cursor}, 200)
@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Production defaults, applied to every new SQLite connection in the pool
+DEFAULT_SQLITE_PRAGMAS = {
+    # Readers no longer block behind the writer (persisted in the db file)
+    "journal_mode": "WAL",
+    # Safe with WAL: only the last transactions can be lost on power failure
+    "synchronous": "NORMAL",
+    # Read the database through a 256 MiB memory map instead of read() calls
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative values are KiB: a 64 MiB page cache per connection
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    # Wait up to 5s for the write lock instead of failing with "database is locked"
+    "busy_timeout": 5000,
+}
+
+
+def apply_sqlite_pragmas(app, engine):
+    if engine.dialect.name != "sqlite":
+        return
+
+    # SQLite ignores foreign keys, ON DELETE CASCADE included, unless each
+    # connection turns them on. That is not tuning, so SQLITE_TUNING=0 keeps it.
+    pragmas = {"foreign_keys": "ON"}
+    if app.config["SQLITE_TUNING_ENABLED"]:
+        pragmas.update(app.config["SQLITE_PRAGMAS"])
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+@contextmanager
+def immediate_transaction(engine):
+    """Yield a connection and its transaction, begun with ``BEGIN IMMEDIATE``.
+
+    pysqlite issues BEGIN itself, and only before DML, which leaves SAVEPOINT
+    outside any transaction. This follows SQLAlchemy's recipe for the
+    driver: its transaction handling is turned off for this one connection
+    and the transaction is begun explicitly. IMMEDIATE takes the write lock
+    up front, so a transaction that reads before it writes can't fail on
+    upgrading to a writer. The caller commits or rolls back.
+    """
+    with engine.connect() as connection:
+        dbapi_connection = connection.connection.driver_connection
+        isolation_level = dbapi_connection.isolation_level
+        dbapi_connection.isolation_level = None
+        transaction = None
+        try:
+            transaction = connection.begin()
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            yield connection, transaction
+        finally:
+            if transaction is not None and transaction.is_active:
+                transaction.rollback()
+            # Back to the driver's own handling before the pool reuses it
+            dbapi_connection.isolation_level = isolation_level
+
+
+# FTS5 indexes are created by raw DDL (see server/models.py), so autogenerate
+# must not try to drop them or their pizza_fts_data, _idx, ... shadow tables
+FTS_TABLES = ("pizza_fts",)
+
+
+def include_name(name, type_, parent_names):
+    if type_ == "table":
+        return not any(name == table or name.startswith(f"{table}_") for table in FTS_TABLES)
+    return True
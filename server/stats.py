@@ -0,0 +1,68 @@
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from server import db
+from server.cache import invalidate
+from server.models import RestaurantMenuStats, RestaurantPizza, table_versions
+
+STATS_COLUMNS = ("pizza_count", "price_total", "price_min", "price_max")
+
+
+def menu_aggregates():
+    # What the triggers maintain, computed from scratch
+    return (
+        select(
+            RestaurantPizza.restaurant_id,
+            func.count().label("pizza_count"),
+            func.sum(RestaurantPizza.price).label("price_total"),
+            func.min(RestaurantPizza.price).label("price_min"),
+            func.max(RestaurantPizza.price).label("price_max"),
+        )
+        .group_by(RestaurantPizza.restaurant_id)
+    )
+
+
+def rebuild_menu_stats():
+    """Recompute every restaurant_menu_stats row in one INSERT ... SELECT.
+
+    The stats routes version their ETags and cache keys by restaurant_pizzas,
+    which the rebuild doesn't write to, so its counter is bumped in the same
+    transaction, as the triggers would.
+    """
+    db.session.execute(RestaurantMenuStats.__table__.delete())
+    db.session.execute(
+        insert(RestaurantMenuStats).from_select(["restaurant_id", *STATS_COLUMNS], menu_aggregates())
+    )
+    db.session.execute(
+        sqlite_insert(table_versions)
+        .values(table_name="restaurant_pizzas", version=1)
+        .on_conflict_do_update(index_elements=["table_name"], set_={"version": table_versions.c.version + 1})
+    )
+    db.session.commit()
+    invalidate("restaurant_pizzas")
+    return db.session.query(RestaurantMenuStats).count()
+
+
+def check_menu_stats():
+    """Return the ids of restaurants whose stored stats differ from their menu.
+
+    Covers stats that disagree, menus without a stats row and stats rows
+    left behind by an emptied menu.
+    """
+    expected = menu_aggregates().subquery()
+    stored = RestaurantMenuStats.__table__
+
+    def differs(left, right):
+        return or_(*[left.c[name] != right.c[name] for name in STATS_COLUMNS])
+
+    wrong_or_missing = (
+        select(expected.c.restaurant_id)
+        .outerjoin(stored, stored.c.restaurant_id == expected.c.restaurant_id)
+        .where(or_(stored.c.restaurant_id.is_(None), differs(stored, expected)))
+    )
+    orphaned = (
+        select(stored.c.restaurant_id)
+        .outerjoin(expected, expected.c.restaurant_id == stored.c.restaurant_id)
+        .where(expected.c.restaurant_id.is_(None))
+    )
+    return sorted(db.session.scalars(wrong_or_missing.union(orphaned)))
@@ -0,0 +1,52 @@
+from flask import Response, current_app, stream_with_context
+
+from server.serializers import dump_many, use_compiled
+
+
+def encode_batch(schema, batch, first):
+    # One batch of array items, comma-joined and led by a comma after the first
+    items = ",".join(
+        current_app.json.dumps(item, separators=(",", ":")) for item in dump_many(schema, batch)
+    )
+    return items if first else "," + items
+
+
+def stream_json_array(session, query, schema):
+    """Stream the ordered ``query`` as a JSON array without building the list in memory.
+
+    Rows are read ``STREAMING_YIELD_PER`` at a time from the cursor and each
+    batch is serialized and written out before the next one is fetched.
+    ``session`` is ``db.session``, or the ``AsyncSession`` of server/asgi.py,
+    whose body is an async generator the ASGI app iterates itself.
+    """
+    query = query.execution_options(yield_per=current_app.config["STREAMING_YIELD_PER"])
+
+    def generate():
+        result = session.execute(query)
+        if not use_compiled(schema):
+            result = result.scalars()
+
+        yield "["
+        first = True
+        for batch in result.partitions():
+            yield encode_batch(schema, batch, first)
+            first = False
+        # Same trailing newline as jsonify
+        yield "]\n"
+
+    async def generate_async():
+        result = await session.stream(query)
+        if not use_compiled(schema):
+            result = result.scalars()
+
+        yield "["
+        first = True
+        async for batch in result.partitions():
+            yield encode_batch(schema, batch, first)
+            first = False
+        yield "]\n"
+
+    if hasattr(session, "stream"):
+        return Response(generate_async(), mimetype="application/json")
+    # Keep the request (and the db session) alive while the body is generated
+    return Response(stream_with_context(generate()), mimetype="application/json")
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from server import create_app, db
+from server.models import table_versions
+
+
+@pytest.fixture(scope="session")
+def app():
+    # One app for the session, on a throwaway database
+    db_dir = tempfile.mkdtemp()
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(db_dir, 'test.db')}",
+        # Responses are cached per process; tests opt back in where they need it
+        "RESPONSE_CACHE_ENABLED": False,
+    })
+    with app.app_context():
+        db.create_all()
+    yield app
+    shutil.rmtree(db_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def clean_db(app):
+    # Empty every table after the test so tests don't see each other's rows
+    yield
+    with app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            # Counters only go up, as in production; cached analytics rely on it
+            if table is not table_versions:
+                db.session.execute(table.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def response_cache(app):
+    app.config["RESPONSE_CACHE_ENABLED"] = True
+    yield app.extensions["response_cache"]
+    app.config["RESPONSE_CACHE_ENABLED"] = False
+    app.extensions["response_cache"].clear()
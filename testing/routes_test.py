@@ -1,22 +1,1183 @@
-from server import app
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import delete, event, select, text
+
+from server import db
+from server.cache import LRUResponseCache
+from server.models import Ingredient, Pizza, Restaurant, RestaurantPizza, pizza_ingredients
+from server.stats import check_menu_stats, rebuild_menu_stats
+
+# Self time of the server package's own modules under -X importtime, in microseconds
+IMPORT_BUDGET_US = 500_000
+
+
+def record_statements(client, method, url, **kwargs):
+    # The SQL statements issued while serving one request
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.open(url, method=method, **kwargs)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return response, statements
+
+
+def count_queries(client, url):
+    # Count the SQL statements issued while serving one request
+    response, statements = record_statements(client, "GET", url)
+    return response, len(statements)
+
+
+def query_plans(client, url, table):
+    # EXPLAIN QUERY PLAN details of every statement on ``table`` one request runs
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if f"FROM {table}" in statement:
+            statements.append((statement, parameters))
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+
+    with engine.connect() as conn:
+        return [
+            [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+            for statement, parameters in statements
+        ]
+
+
+async def asgi_request(application, method, url, body=b"", headers=(), disconnect_after=None):
+    # Drive one request through an ASGI callable; returns (status, headers, body).
+    # The client stays connected until the response is complete, or until it
+    # has received disconnect_after body chunks.
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "http_version": "1.1",
+    }
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+    gone = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if not message.get("more_body") and message["type"] == "http.response.body":
+            gone.set()
+        if disconnect_after is not None and len(sent) > disconnect_after:
+            gone.set()
+
+    await application(scope, receive, send)
+    start, chunks = sent[0], sent[1:]
+    return (
+        start["status"],
+        {name.decode(): value.decode() for name, value in start["headers"]},
+        b"".join(chunk.get("body", b"") for chunk in chunks),
+    )
+
 
 class TestApp:
-    def test_home_view(self):
+    def test_home_view(self, app):
      client = app.test_client(self)
      response = client.get("/")
      assert response.status_code == 200
 
-    def test_restaurant_view(self):
+    def test_restaurant_view(self, app):
      client = app.test_client(self)
      response = client.get("/restaurants")
      assert response.status_code == 200
 
-    def test_pizza_view(self):
+    def test_pizza_view(self, app):
      client = app.test_client(self)
      response = client.get("/pizzas")
      assert response.status_code == 200
 
-    def test_restaurant_pizza_view(self):
+    def test_restaurant_pizza_view(self, app):
      client = app.test_client(self)
      response = client.get('/restaurantspizza')
-     assert response.status_code == 200
\ No newline at end of file
+     assert response.status_code == 200
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_restaurant_pizza_pages_match_array(self, app, monkeypatch):
+     monkeypatch.setitem(app.config, "PAGINATION_MAX_LIMIT", 5)
+     monkeypatch.setitem(app.config, "PAGINATION_SAFETY_CAP", 7)
+     client = app.test_client(self)
+     with app.app_context():
+        restaurants = [Restaurant(name=f"Restaurant {i}", address=f"{i} Main St") for i in range(3)]
+        pizzas = [Pizza(name=f"Pizza {i}", ingredients="Dough") for i in range(4)]
+        db.session.add_all(
+            RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10)
+            for restaurant in restaurants
+            for pizza in pizzas
+        )
+        db.session.commit()
+        ids = [entry.id for entry in RestaurantPizza.query.order_by(RestaurantPizza.id)]
+     assert len(ids) == 12
+
+     # A limit above PAGINATION_MAX_LIMIT is clamped to it; walking the pages
+     # returns every row once, in id order
+     paged, cursor = [], None
+     while True:
+        url = "/restaurantspizza?limit=50" + (f"&after={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        assert len(body["data"]) <= 5
+        paged.extend(body["data"])
+        cursor = body["next"]
+        if cursor is None:
+            break
+     assert [entry["id"] for entry in paged] == ids
+
+     # Without pagination params the array stops at PAGINATION_SAFETY_CAP,
+     # with a Link to the rest
+     response = client.get("/restaurantspizza")
+     assert [entry["id"] for entry in response.get_json()] == ids[:7]
+     link, rel = response.headers["Link"].split("; ")
+     assert rel == 'rel="next"'
+     rest = client.get(link.strip("<>")).get_json()
+     assert [entry["id"] for entry in rest["data"]] == ids[7:12]
+     assert rest["next"] is None
+
+    def test_invalid_pagination_params(self, app):
+     client = app.test_client(self)
+     assert client.get("/pizzas?limit=abc").status_code == 400
+     assert client.get("/pizzas?limit=0").status_code == 400
+     assert client.get("/pizzas?after=not-a-cursor").status_code == 400
+
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_restaurant_detail_includes_menu_in_constant_queries(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        small = Restaurant(name="Small Menu", address="1 Main St")
+        large = Restaurant(name="Large Menu", address="2 Main St")
+        pizzas = [Pizza(name=f"Pizza {i}", ingredients="Dough, Cheese") for i in range(20)]
+        db.session.add_all([small, large, *pizzas])
+        db.session.flush()
+        db.session.add(RestaurantPizza(restaurant_id=small.id, pizza_id=pizzas[0].id, price=10))
+        db.session.add_all(
+            RestaurantPizza(restaurant_id=large.id, pizza_id=pizza.id, price=12) for pizza in pizzas
+        )
+        db.session.commit()
+        small_id, large_id, first_pizza_id = small.id, large.id, pizzas[0].id
+
+     small_response, small_queries = count_queries(client, f"/restaurants/{small_id}")
+     large_response, large_queries = count_queries(client, f"/restaurants/{large_id}")
+
+     assert small_response.get_json()["pizzas"] == [
+        {"id": first_pizza_id, "name": "Pizza 0", "ingredients": "Dough, Cheese", "price": "10.00"}
+     ]
+     assert len(large_response.get_json()["pizzas"]) == 20
+     assert small_queries == large_queries
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_duplicate_menu_entry_is_rejected(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        db.session.add_all([
+            Restaurant(name="Pizza Inn", address="Moi Avenue"),
+            Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese"),
+        ])
+        db.session.commit()
+
+     form = {"price": "10", "pizza_name": "Margherita", "restaurant_name": "Pizza Inn"}
+     assert client.post("/restaurantspizza", data=form).status_code == 201
+     assert client.post("/restaurantspizza", data=form).status_code == 409
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_bulk_ingest_reports_row_errors(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        db.session.add_all([
+            Restaurant(name="Pizza Inn", address="Moi Avenue"),
+            Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese"),
+            Pizza(name="Hawaiian", ingredients="Dough, Cheese, Ham, Pineapple"),
+        ])
+        db.session.commit()
+
+     rows = [
+        {"price": 10, "pizza_name": "Margherita", "restaurant_name": "Pizza Inn"},
+        {"price": 45, "pizza_name": "Hawaiian", "restaurant_name": "Pizza Inn"},
+        {"price": 12, "pizza_name": "Pepperoni", "restaurant_name": "Pizza Inn"},
+        {"price": 11, "pizza_name": "Margherita", "restaurant_name": "Pizza Inn"},
+        {"price": 12, "pizza_name": "Hawaiian", "restaurant_name": "Pizza Inn"},
+     ]
+     response = client.post("/restaurantspizza/bulk?chunk_size=2", json=rows)
+
+     assert response.status_code == 207
+     body = response.get_json()
+     assert body["inserted"] == 2
+     assert [error["index"] for error in body["errors"]] == [1, 2, 3]
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_bulk_ingest_accepts_ndjson(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        db.session.add_all([
+            Restaurant(name="Pizza Inn", address="Moi Avenue"),
+            Restaurant(name="Dominion Pizza", address="Ngong Road"),
+            Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese"),
+        ])
+        db.session.commit()
+
+     body = (
+        '{"price": 10, "pizza_name": "Margherita", "restaurant_name": "Pizza Inn"}\n'
+        '\n'
+        '{"price": 9, "pizza_name": "Margherita", "restaurant_name": "Dominion Pizza"}\n'
+     )
+     response = client.post(
+        "/restaurantspizza/bulk", data=body, content_type="application/x-ndjson"
+     )
+
+     assert response.status_code == 201
+     assert response.get_json()["inserted"] == 2
+     assert len(client.get("/restaurantspizza").get_json()) == 2
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_streamed_list_matches_array(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        db.session.add_all(
+            Pizza(name=f"Pizza {i}", ingredients="Dough, Cheese") for i in range(25)
+        )
+        db.session.commit()
+
+     app.config["STREAMING_YIELD_PER"], yield_per = 10, app.config["STREAMING_YIELD_PER"]
+     try:
+        streamed = client.get("/pizzas?stream=true")
+     finally:
+        app.config["STREAMING_YIELD_PER"] = yield_per
+
+     assert streamed.is_streamed
+     assert streamed.data == client.get("/pizzas").data
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_export_ndjson_and_csv(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        restaurant = Restaurant(name="Pizza Inn", address="Moi Avenue")
+        pizza = Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese")
+        db.session.add(RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10))
+        db.session.commit()
+
+     ndjson = client.get("/export/restaurantspizza.ndjson")
+     rows = [json.loads(line) for line in ndjson.data.splitlines()]
+     assert len(rows) == 1
+     assert rows[0]["restaurant_name"] == "Pizza Inn"
+     assert rows[0]["pizza_name"] == "Margherita"
+     assert rows[0]["price"] == "10.00"
+
+     exported = client.get("/export/restaurantspizza.csv")
+     records = list(csv.DictReader(io.StringIO(exported.get_data(as_text=True))))
+     assert records[0]["ingredients"] == "Dough, Tomato Sauce, Cheese"
+
+     compressed = client.get("/export/restaurantspizza.csv?gzip=true")
+     assert compressed.headers["Content-Encoding"] == "gzip"
+     assert gzip.decompress(compressed.data) == exported.data
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_etag_revalidation(self, app):
+     client = app.test_client(self)
+     first = client.get("/pizzas")
+     etag = first.headers["ETag"]
+
+     unchanged = client.get("/pizzas", headers={"If-None-Match": etag})
+     assert unchanged.status_code == 304
+     assert unchanged.data == b""
+
+     # Other tables and query strings don't share the pizzas list's tag
+     assert client.get("/pizzas?limit=5").headers["ETag"] != etag
+     with app.app_context():
+        db.session.add(Restaurant(name="Pizza Inn", address="Moi Avenue"))
+        db.session.commit()
+     assert client.get("/pizzas", headers={"If-None-Match": etag}).status_code == 304
+
+     with app.app_context():
+        db.session.add(Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese"))
+        db.session.commit()
+     changed = client.get("/pizzas", headers={"If-None-Match": etag})
+     assert changed.status_code == 200
+     assert changed.headers["ETag"] != etag
+
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_cached_responses_are_invalidated_by_writes(self, app, response_cache):
+     client = app.test_client(self)
+     with app.app_context():
+        pizza = Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese")
+        db.session.add_all([pizza, Restaurant(name="Pizza Inn", address="Moi Avenue")])
+        db.session.commit()
+        pizza_id = pizza.id
+
+     assert client.get("/pizzas").headers["X-Cache"] == "MISS"
+     assert client.get("/pizzas").headers["X-Cache"] == "HIT"
+     assert client.get("/restaurants").headers["X-Cache"] == "MISS"
+
+     # Deleting a pizza drops the pizza responses but keeps the restaurant list
+     client.delete(f"/pizzas/{pizza_id}")
+     pizzas = client.get("/pizzas")
+     assert pizzas.headers["X-Cache"] == "MISS"
+     assert pizzas.get_json() == []
+     assert client.get("/restaurants").headers["X-Cache"] == "HIT"
+
+     stats = response_cache.stats()
+     assert stats["hits"] == {"pizzas": 1, "restaurants": 1}
+     assert stats["misses"] == {"pizzas": 2, "restaurants": 1}
+
+     # A write from another process never invalidates this one's cache, but
+     # it moves the table versions the entries are keyed by
+     etag = client.get("/restaurants").headers["ETag"]
+     with app.app_context():
+        db.session.execute(delete(Restaurant))
+        db.session.commit()
+     restaurants = client.get("/restaurants", headers={"If-None-Match": etag})
+     assert restaurants.status_code == 200
+     assert restaurants.headers["X-Cache"] == "MISS"
+     assert restaurants.get_json() == []
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_deletes_cascade_in_one_statement(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        assert db.session.execute(text("PRAGMA foreign_keys")).scalar() == 1
+        kept = Restaurant(name="Kept Inn", address="Moi Avenue")
+        deleted = Restaurant(name="Deleted Inn", address="Tom Mboya Street")
+        pizzas = [Pizza(name=f"Pizza {i}", ingredients="Dough, Cheese") for i in range(5)]
+        db.session.add_all(RestaurantPizza(restaurant=deleted, pizza=pizza, price=10 + i) for i, pizza in enumerate(pizzas))
+        db.session.add(RestaurantPizza(restaurant=kept, pizza=pizzas[0], price=20))
+        db.session.commit()
+        kept_id, deleted_id, pizza_id = kept.id, deleted.id, pizzas[0].id
+
+     response, statements = record_statements(client, "DELETE", f"/restaurants/{deleted_id}")
+     assert response.status_code == 200
+     assert [s.split()[0] for s in statements if not s.startswith("SELECT")] == ["DELETE"]
+     assert client.delete(f"/restaurants/{deleted_id}").status_code == 404
+
+     response, statements = record_statements(client, "DELETE", f"/pizzas/{pizza_id}")
+     assert response.status_code == 200
+     assert [s.split()[0] for s in statements if not s.startswith("SELECT")] == ["DELETE"]
+
+     with app.app_context():
+        # The menu entries, stats and ingredient links went with their parents
+        assert db.session.query(RestaurantPizza).count() == 0
+        assert db.session.execute(
+            select(pizza_ingredients).where(pizza_ingredients.c.pizza_id == pizza_id)
+        ).all() == []
+        assert check_menu_stats() == []
+     assert client.get(f"/restaurants/{kept_id}").get_json()["pizzas"] == []
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_bulk_delete_by_ids_and_filter(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        chain = [Restaurant(name=f"Chain {i}", address="Moi Avenue") for i in range(3)]
+        other = Restaurant(name="Other Inn", address="Moi Avenue")
+        pizzas = [
+            Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese"),
+            Pizza(name="Hawaiian", ingredients="Dough, Cheese, Pineapple"),
+            Pizza(name="Pineapple Special", ingredients="Dough, Pineapple"),
+        ]
+        db.session.add_all(
+            RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10)
+            for restaurant in (*chain, other)
+            for pizza in pizzas
+        )
+        db.session.commit()
+        chain_ids, other_id = [restaurant.id for restaurant in chain], other.id
+        pizza_ids = [pizza.id for pizza in pizzas]
+
+     invalid_bodies = (
+        None,
+        {},
+        {"filter": {}},
+        {"filter": {"city": "Nairobi"}},
+        {"ids": ["1"]},
+        {"ids": [1], "filter": {"address": "x"}},
+        {"filter": {"address": [1]}},
+        # An option the endpoint doesn't have must not be ignored
+        {"ids": [1], "dry_run": True},
+     )
+     for body in invalid_bodies:
+        assert client.delete("/restaurants", json=body).status_code == 400, body
+
+     # Two restaurants per chunk, and at most two menu entries per DELETE and commit
+     response, statements = record_statements(
+        client, "DELETE", "/restaurants?chunk_size=2", json={"filter": {"name_prefix": "Chain"}}
+     )
+     assert response.get_json() == {"deleted": 3, "restaurant_pizzas_deleted": 9}
+     deletes = [statement for statement in statements if statement.startswith("DELETE")]
+     assert sum('FROM "Restaurant"' in statement for statement in deletes) == 2
+     assert sum("FROM restaurant_pizzas" in statement for statement in deletes) == 6
+     assert [r["id"] for r in client.get("/restaurants").get_json()] == [other_id]
+
+     response = client.delete("/pizzas", json={"filter": {"ingredients": "pineapple", "exclude": "tomato sauce"}})
+     assert response.get_json() == {"deleted": 2, "restaurant_pizzas_deleted": 2}
+
+     response = client.delete("/pizzas", json={"ids": [pizza_ids[0], pizza_ids[1], 0]})
+     assert response.get_json() == {"deleted": 1, "restaurant_pizzas_deleted": 1, "not_found": [0, pizza_ids[1]]}
+
+     with app.app_context():
+        assert db.session.query(RestaurantPizza).count() == 0
+        assert db.session.query(Pizza).count() == 0
+        assert check_menu_stats() == []
+     assert client.get(f"/restaurants/{other_id}").get_json()["pizzas"] == []
+     assert client.get(f"/restaurants/{chain_ids[0]}").get_json() == {"error": "Restaurant not found"}
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_batch_requests(self, app, response_cache):
+     client = app.test_client(self)
+     with app.app_context():
+        restaurant = Restaurant(name="Pizza Inn", address="Moi Avenue")
+        pizzas = [Pizza(name=f"Pizza {i}", ingredients="Dough, Cheese") for i in range(2)]
+        db.session.add_all(RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10) for pizza in pizzas)
+        db.session.commit()
+        restaurant_id, pizza_ids = restaurant.id, [pizza.id for pizza in pizzas]
+
+     # A restaurant page in one round trip, matching the separate requests
+     paths = [f"/restaurants/{restaurant_id}", *(f"/pizzas/{id}" for id in pizza_ids), "/missing"]
+     checkouts = []
+
+     def checkout(dbapi_connection, connection_record, connection_proxy):
+        checkouts.append(connection_record)
+
+     with app.app_context():
+        engine = db.engine
+     event.listen(engine, "checkout", checkout)
+     try:
+        response = client.post("/batch", json={"requests": [{"path": path} for path in paths]})
+     finally:
+        event.remove(engine, "checkout", checkout)
+     # One session, so one connection checkout for the whole batch
+     assert len(checkouts) == 1
+     assert response.status_code == 207
+     results = response.get_json()["responses"]
+     assert [r["status"] for r in results] == [200, 200, 200, 404]
+     for path, result in zip(paths[:3], results):
+        assert result["body"] == client.get(path).get_json()
+        assert result["headers"]["ETag"] == client.get(path).headers["ETag"]
+     assert "queries" in response.headers["Server-Timing"]
+
+     for body in (None, {"requests": {}}, {"requests": [{"path": "pizzas"}]}, {"requests": [], "atomic": "yes"}):
+        assert client.post("/batch", json=body).status_code == 400, body
+     assert client.post("/batch", json={"requests": [{"path": "/"}] * 51}).status_code == 400
+     nested = client.post("/batch", json={"requests": [{"method": "POST", "path": "/batch", "body": {"requests": []}}]})
+     assert nested.get_json()["responses"][0]["status"] == 400
+
+     # Atomic: the failed POST rolls back the delete before it, and the rest don't run
+     assert client.get("/restaurantspizza").headers["X-Cache"] == "MISS"
+     form = {"price": "40", "pizza_name": "Pizza 0", "restaurant_name": "Pizza Inn"}
+     response = client.post("/batch", json={"atomic": True, "requests": [
+        {"method": "DELETE", "path": f"/pizzas/{pizza_ids[1]}"},
+        {"path": "/restaurantspizza"},
+        {"method": "POST", "path": "/restaurantspizza", "form": form},
+        {"path": "/pizzas"},
+     ]})
+     assert response.status_code == 207
+     assert response.get_json()["rolled_back"] is True
+     results = response.get_json()["responses"]
+     assert [r["status"] for r in results] == [200, 200, 500, 424]
+     # The read inside the transaction saw the delete but wasn't cached
+     assert [entry["pizza_id"] for entry in results[1]["body"]] == pizza_ids[:1]
+     assert "X-Cache" not in results[1]["headers"]
+     # Nor tagged: the ETag would come from counters the rollback reverted
+     assert "ETag" not in results[1]["headers"]
+     assert client.get("/restaurantspizza").headers["X-Cache"] == "HIT"
+     assert [entry["pizza_id"] for entry in client.get("/restaurantspizza").get_json()] == pizza_ids
+
+     # Atomic and successful: committed, and the cache invalidated after the commit
+     response = client.post("/batch", json={"atomic": True, "requests": [
+        {"method": "DELETE", "path": f"/pizzas/{pizza_ids[1]}"},
+        {"method": "DELETE", "path": f"/pizzas/{pizza_ids[0]}"},
+     ]})
+     assert response.status_code == 200
+     assert response.get_json()["rolled_back"] is False
+     assert [r["body"] for r in response.get_json()["responses"]] == [{"Message": "Pizza deleted successfully!"}] * 2
+     pizzas = client.get("/restaurantspizza")
+     assert pizzas.headers["X-Cache"] == "MISS"
+     assert pizzas.get_json() == []
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_seed_reset_keeps_table_versions(self, app):
+     runner = app.test_cli_runner()
+     assert runner.invoke(args=["seed", "--restaurants", "6", "--pizzas", "8", "--menu-mean", "3"]).exit_code == 0
+     with app.app_context():
+        before = dict(db.session.execute(text("SELECT table_name, version FROM table_versions")).all())
+
+     # A smaller catalog would bring restarted counters back to used values
+     args = ["seed", "--restaurants", "2", "--pizzas", "3", "--menu-mean", "1", "--reset"]
+     assert runner.invoke(args=args).exit_code == 0
+     with app.app_context():
+        after = dict(db.session.execute(text("SELECT table_name, version FROM table_versions")).all())
+     # The reset's deletes count too, so no version (and ETag) is reused
+     assert all(after[table] > before[table] for table in before)
+
+    def test_lru_cache_evicts_and_expires(self):
+     now = [0]
+     cache = LRUResponseCache(max_bytes=10, clock=lambda: now[0])
+     cache.set("a", 200, [], b"aaaa", ttl=5, tags=["A"])
+     cache.set("b", 200, [], b"bbbb", ttl=50, tags=["B"])
+     cache.get("route", "a")
+     # "b" is now the least recently used entry and makes room for "c"
+     cache.set("c", 200, [], b"cccc", ttl=50, tags=["C"])
+     assert cache.get("route", "b") is None
+     assert cache.get("route", "a") is not None
+
+     now[0] = 10
+     assert cache.get("route", "a") is None
+     assert cache.get("route", "c") is not None
+     cache.invalidate("C")
+     assert cache.get("route", "c") is None
+
+    def test_sqlite_tuning_profile_is_applied(self, app):
+     with app.app_context():
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert db.session.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert db.session.execute(text("PRAGMA cache_size")).scalar() == -64 * 1024
+
+    def test_server_timing_reports_queries(self, app):
+     client = app.test_client(self)
+     response, queries = count_queries(client, "/restaurants")
+
+     server_timing = response.headers["Server-Timing"]
+     assert f'desc="{queries} queries"' in server_timing
+     assert "serialize;dur=" in server_timing
+     assert "total;dur=" in server_timing
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_streamed_responses_are_timed_in_full(self, app, caplog, monkeypatch):
+     monkeypatch.setitem(app.config, "STREAMING_YIELD_PER", 2)
+     with app.app_context():
+        pizza = Pizza(name="Margherita", ingredients="Dough, Cheese")
+        restaurants = [Restaurant(name=f"Pizza Inn {i}", address="Moi Avenue") for i in range(5)]
+        db.session.add_all(RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10) for restaurant in restaurants)
+        db.session.commit()
+        engine = db.engine
+
+     statements = []
+
+     def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+     client = app.test_client(self)
+     event.listen(engine, "before_cursor_execute", before_cursor_execute)
+     try:
+        with caplog.at_level("INFO", logger="server.requests"):
+            response = client.get("/restaurantspizza?stream=true")
+            # Nothing is logged until the body has been generated and sent
+            assert not caplog.records
+            assert len(response.get_json()) == 5
+            response.close()
+     finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+     # The header went out before the rows were read, and says so
+     assert 'partial;desc="streamed body not included"' in response.headers["Server-Timing"]
+     [record] = caplog.records
+     assert record.db_queries == len(statements)
+     assert any("FROM restaurant_pizzas" in statement for statement in statements)
+     assert record.serialize_ms > 0
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_compiled_serializers_match_marshmallow(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        restaurant = Restaurant(name="Pizza Inn", address="Moi Avenue")
+        pizza = Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese")
+        db.session.add(RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10))
+        db.session.commit()
+        pizza.ingredients = "Dough, Tomato Sauce, Mozzarella"
+        db.session.commit()
+
+     urls = ["/restaurants", "/pizzas", "/restaurantspizza", "/pizzas?limit=1", "/pizzas?stream=true"]
+     modes = app.config["SERIALIZER_MODES"]
+     try:
+        app.config["SERIALIZER_MODES"] = {}
+        expected = [client.get(url).data for url in urls]
+        app.config["SERIALIZER_MODES"] = dict.fromkeys(["restaurants", "pizzas", "restaurantpizzas"], "compiled")
+        compiled = [client.get(url).data for url in urls]
+     finally:
+        app.config["SERIALIZER_MODES"] = modes
+
+     assert compiled == expected
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_sparse_fieldsets(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        restaurant = Restaurant(name="Pizza Inn", address="Moi Avenue")
+        pizza = Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese")
+        db.session.add(RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10))
+        db.session.commit()
+        restaurant_id, pizza_id = restaurant.id, pizza.id
+
+     statements = []
+
+     def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+     with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", record)
+     try:
+        assert client.get("/pizzas?fields=id,name").get_json() == [{"id": pizza_id, "name": "Margherita"}]
+        assert client.get("/pizzas?fields=name&limit=1").get_json()["data"] == [{"name": "Margherita"}]
+        assert client.get(f"/pizzas/{pizza_id}?fields=name").get_json() == {"name": "Margherita"}
+     finally:
+        with app.app_context():
+           event.remove(db.engine, "before_cursor_execute", record)
+     # The unrequested columns are never selected
+     assert statements and not any("ingredients" in statement for statement in statements)
+
+     detail = client.get(f"/restaurants/{restaurant_id}?fields=name").get_json()
+     assert detail == {"name": "Pizza Inn"}
+     detail = client.get(f"/restaurants/{restaurant_id}?fields=id,pizzas").get_json()
+     assert detail["pizzas"][0]["name"] == "Margherita"
+
+     exported = client.get("/export/restaurantspizza.csv?fields=price,pizza_name").data.decode()
+     assert exported.splitlines() == ["pizza_name,price", "Margherita,10.00"]
+
+     for url in ["/pizzas?fields=id,colour", "/restaurantspizza?fields=", f"/restaurants/{restaurant_id}?fields=menu", "/export/restaurantspizza.ndjson?fields=secret"]:
+        response = client.get(url)
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_restaurant_pizza_filters_and_sort(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        restaurants = [Restaurant(name=f"Restaurant {i}", address=f"{i} Main St") for i in range(2)]
+        pizzas = [Pizza(name=f"Pizza {i}", ingredients="Dough") for i in range(3)]
+        prices = [[12, 5, 30], [5, 8, 12]]
+        db.session.add_all(
+            RestaurantPizza(restaurant=restaurant, pizza=pizza, price=price)
+            for restaurant, row in zip(restaurants, prices)
+            for pizza, price in zip(pizzas, row)
+        )
+        db.session.commit()
+        restaurant_id, pizza_id = restaurants[0].id, pizzas[0].id
+
+     def prices_for(query):
+        response = client.get(f"/restaurantspizza?{query}")
+        assert response.status_code == 200
+        return [float(item["price"]) for item in response.get_json()]
+
+     assert prices_for(f"restaurant_id={restaurant_id}") == [12, 5, 30]
+     assert prices_for(f"pizza_id={pizza_id}") == [12, 5]
+     assert prices_for("price_min=8&price_max=12") == [8, 12, 12]
+     assert prices_for(f"restaurant_id={restaurant_id}&sort=-price") == [30, 12, 5]
+     assert prices_for("created_after=2000-01-01") == [12, 5, 30, 5, 8, 12]
+     assert prices_for("created_after=2999-01-01") == []
+
+     # Keyset pages in price order, ties broken by id
+     pages, url = [], "/restaurantspizza?sort=price&limit=4"
+     while url:
+        body = client.get(url).get_json()
+        pages.append([float(item["price"]) for item in body["data"]])
+        url = body["next"] and f"/restaurantspizza?sort=price&limit=4&after={body['next']}"
+     assert pages == [[5, 5, 8, 12], [12, 30]]
+
+     # The rows share a created_at second, so these pages rely on the id tie-break
+     ids, url = [], "/restaurantspizza?sort=-created_at&limit=1"
+     while url:
+        body = client.get(url).get_json()
+        ids += [item["id"] for item in body["data"]]
+        url = body["next"] and f"/restaurantspizza?sort=-created_at&limit=1&after={body['next']}"
+     assert len(ids) == 6 and ids == sorted(ids, reverse=True)
+
+     for query in ["sort=name", "sort=-ingredients", "price_min=cheap", "restaurant_id=x", "created_after=yesterday"]:
+        response = client.get(f"/restaurantspizza?{query}")
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+    def test_restaurant_pizza_filters_use_indexes(self, app):
+     client = app.test_client(self)
+     filters = [
+        "restaurant_id=1",
+        "pizza_id=1",
+        "price_min=5",
+        "price_max=20",
+        "price_min=5&price_max=20",
+        "created_after=2023-01-01",
+        "restaurant_id=1&pizza_id=1",
+        "restaurant_id=1&price_min=5&price_max=20",
+        "pizza_id=1&price_max=20",
+        "restaurant_id=1&created_after=2023-01-01",
+        "price_min=5&created_after=2023-01-01",
+     ]
+     # An explicit id sort on a bare range walks the table in rowid order instead,
+     # stopping once the page is full, so it isn't checked here
+     for sort in ["", "&sort=price", "&sort=-price", "&sort=created_at", "&sort=-created_at"]:
+        for query in filters:
+           for plan in query_plans(client, f"/restaurantspizza?{query}{sort}&limit=10", "restaurant_pizzas"):
+              # Every filter combination is answered from an index, never a full table scan
+              assert any("USING" in step for step in plan), (query + sort, plan)
+
+     # The whitelisted sorts come straight off an index, with no sort step
+     for sort in ["id", "-id", "price", "-price", "created_at", "-created_at"]:
+        for plan in query_plans(client, f"/restaurantspizza?sort={sort}&limit=10", "restaurant_pizzas"):
+           assert not any("TEMP B-TREE" in step for step in plan), (sort, plan)
+     for query in ["restaurant_id=1&sort=price", "pizza_id=1&sort=-price"]:
+        for plan in query_plans(client, f"/restaurantspizza?{query}&limit=10", "restaurant_pizzas"):
+           assert not any("TEMP B-TREE" in step for step in plan), (query, plan)
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_pizza_full_text_search(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        db.session.add_all([
+            Pizza(name="Mushroom Magic", ingredients="Dough, Tomato Sauce, Mushrooms"),
+            Pizza(name="Forest", ingredients="Dough, Cheese, Mushrooms, Spinach"),
+            Pizza(name="Hawaiian", ingredients="Dough, Cheese, Ham, Pineapple"),
+        ])
+        db.session.commit()
+        hawaiian = Pizza.query.filter_by(name="Hawaiian").one()
+        hawaiian.ingredients = "Dough, Cheese, Ham, Pineapple, Mushrooms"
+        db.session.commit()
+        db.session.delete(Pizza.query.filter_by(name="Forest").one())
+        db.session.commit()
+
+     def names(query):
+        response = client.get(f"/pizzas/search?{query}")
+        assert response.status_code == 200
+        return [pizza["name"] for pizza in response.get_json()["data"]]
+
+     # Prefix matching; the triggers indexed the update and dropped the deleted pizza,
+     # and a match on the name ranks above one in the ingredients
+     assert names("q=mush") == ["Mushroom Magic", "Hawaiian"]
+     assert names("q=chee pine") == ["Hawaiian"]
+     # FTS5 syntax in the input is matched literally
+     assert names('q=ham"*') == ["Hawaiian"]
+     assert names("q=anchovies") == []
+
+     first = client.get("/pizzas/search?q=dough&limit=1&fields=name").get_json()
+     second = client.get(f"/pizzas/search?q=dough&limit=1&fields=name&after={first['next']}").get_json()
+     assert len(first["data"] + second["data"]) == 2 and second["next"] is None
+     assert first["data"][0] != second["data"][0] and list(first["data"][0]) == ["name"]
+
+     for query in ["", "q=", "q=%22*%22", "q=cheese&fields=price"]:
+        assert client.get(f"/pizzas/search?{query}").status_code == 400
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_pizzas_filtered_by_ingredients(self, app):
+     client = app.test_client(self)
+     with app.app_context():
+        db.session.add_all([
+            Pizza(name="Margherita", ingredients="Dough, Tomato Sauce, Cheese"),
+            Pizza(name="Sausage Feast", ingredients="Dough, Cheese, Sausage"),
+            Pizza(name="Meat Lovers", ingredients="Dough, Cheese, Sausage, Pork"),
+            Pizza(name="Vegan", ingredients="Dough, Tomato Sauce"),
+        ])
+        db.session.commit()
+        vegan = Pizza.query.filter_by(name="Vegan").one()
+        vegan.ingredients = "Dough, Tomato Sauce, Mushrooms"
+        db.session.commit()
+        assert Ingredient.query.count() == 6
+        margherita_id = Pizza.query.filter_by(name="Margherita").one().id
+
+     def names(query):
+        response = client.get(f"/pizzas?{query}")
+        assert response.status_code == 200
+        return [pizza["name"] for pizza in response.get_json()]
+
+     assert names("ingredients=cheese,sausage&exclude=pork") == ["Sausage Feast"]
+     assert names("ingredients=Cheese, SAUSAGE") == ["Sausage Feast", "Meat Lovers"]
+     assert names("ingredients=mushrooms") == ["Vegan"]
+     assert names("exclude=cheese") == ["Vegan"]
+     assert names("ingredients=cheese,truffle") == []
+     # The legacy string is still served as it was stored
+     assert client.get("/pizzas?ingredients=tomato sauce&limit=1").get_json()["data"][0]["ingredients"] == "Dough, Tomato Sauce, Cheese"
+
+     assert client.delete(f"/pizzas/{margherita_id}").status_code == 200
+     with app.app_context():
+        links = db.session.execute(pizza_ingredients.select().where(pizza_ingredients.c.pizza_id == margherita_id))
+        assert links.all() == []
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_menu_stats_are_maintained_incrementally(self, app, response_cache):
+     client = app.test_client(self)
+     with app.app_context():
+        inn, palace = Restaurant(name="Pizza Inn", address="Moi Avenue"), Restaurant(name="Palace", address="Kimathi St")
+        pizzas = [Pizza(name=f"Pizza {i}", ingredients="Dough") for i in range(4)]
+        entries = [RestaurantPizza(restaurant=inn, pizza=pizza, price=price) for pizza, price in zip(pizzas, [10, 4, 25, 7])]
+        db.session.add_all([palace, *entries])
+        db.session.commit()
+        inn_id, palace_id = inn.id, palace.id
+
+        # Drop the current min, raise another price to the max, move one entry away
+        db.session.delete(entries[1])
+        entries[3].price = 30
+        entries[0].restaurant = palace
+        db.session.commit()
+        assert check_menu_stats() == []
+
+     stats = client.get(f"/restaurants/{inn_id}/stats").get_json()
+     assert stats == {"restaurant_id": inn_id, "pizza_count": 2, "price_min": "25.00", "price_max": "30.00", "price_avg": "27.50"}
+     listed = {r["id"]: r["stats"] for r in client.get("/restaurants?include=stats").get_json()}
+     assert listed[palace_id] == {"pizza_count": 1, "price_min": "10.00", "price_max": "10.00", "price_avg": "10.00"}
+     assert "stats" not in client.get("/restaurants").get_json()[0]
+
+     # Emptying a menu removes its row; the API reports it as empty
+     with app.app_context():
+        RestaurantPizza.query.filter_by(restaurant_id=palace_id).delete()
+        db.session.commit()
+        assert check_menu_stats() == []
+     stats = client.get(f"/restaurants/{palace_id}/stats").get_json()
+     assert stats == {"restaurant_id": palace_id, "pizza_count": 0, "price_min": None, "price_max": None, "price_avg": None}
+     assert client.get("/restaurants/0/stats").status_code == 404
+
+     with app.app_context():
+        db.session.execute(text("UPDATE restaurant_menu_stats SET pizza_count = 5"))
+        db.session.commit()
+        assert check_menu_stats() == [inn_id]
+     drifted = client.get(f"/restaurants/{inn_id}/stats")
+     assert drifted.get_json()["pizza_count"] == 5
+     with app.app_context():
+        assert rebuild_menu_stats() == 1
+        assert check_menu_stats() == []
+
+     # The rebuild moves the ETag and cache key of the drifted response
+     response = client.get(f"/restaurants/{inn_id}/stats", headers={"If-None-Match": drifted.headers["ETag"]})
+     assert response.status_code == 200 and response.headers["X-Cache"] == "MISS"
+     assert response.get_json()["pizza_count"] == 2
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_price_analytics(self, app):
+     pytest.importorskip("numpy")
+     client = app.test_client(self)
+     with app.app_context():
+        restaurants = [Restaurant(name=f"Restaurant {i}", address=f"{i} Main St") for i in range(2)]
+        pizzas = [Pizza(name=f"Pizza {i}", ingredients="Dough") for i in range(3)]
+        prices = [[10, 20, 30], [5, 7, 30]]
+        db.session.add_all(
+            RestaurantPizza(restaurant=restaurant, pizza=pizza, price=price)
+            for restaurant, row in zip(restaurants, prices)
+            for pizza, price in zip(pizzas, row)
+        )
+        db.session.commit()
+        restaurant_ids = [restaurant.id for restaurant in restaurants]
+        pizza_ids = [pizza.id for pizza in pizzas]
+
+     summary = client.get("/analytics/prices?percentiles=50,100&bins=5").get_json()
+     assert summary["count"] == 6 and summary["min"] == "5.00" and summary["max"] == "30.00"
+     assert summary["mean"] == "17.00"
+     assert summary["percentiles"] == {"p50": "15.00", "p100": "30.00"}
+     assert [bucket["count"] for bucket in summary["histogram"]] == [2, 1, 0, 1, 2]
+
+     by_pizza = client.get("/analytics/prices?group_by=pizza").get_json()["data"]
+     assert [group["pizza_id"] for group in by_pizza] == pizza_ids
+     assert by_pizza[0] == {"pizza_id": pizza_ids[0], "count": 2, "min": "5.00", "max": "10.00", "mean": "7.50", "median": "7.50", "spread": "5.00"}
+
+     # Appended rows are read on their own; other writes reload everything
+     columns = app.extensions["price_columns"]
+     with app.app_context():
+        extra = Pizza(name="Pizza 3", ingredients="Dough")
+        db.session.add(RestaurantPizza(restaurant_id=restaurant_ids[0], pizza=extra, price=12))
+        db.session.commit()
+        assert columns.appended_only(columns.columns, columns.version + 1)
+     page = client.get("/analytics/prices?group_by=restaurant&limit=1").get_json()
+     assert page["data"][0]["count"] == 4 and page["data"][0]["median"] == "16.00"
+     page = client.get(f"/analytics/prices?group_by=restaurant&limit=1&after={page['next']}").get_json()
+     assert page["data"][0]["restaurant_id"] == restaurant_ids[1] and page["next"] is None
+
+     with app.app_context():
+        RestaurantPizza.query.filter_by(price=30).delete()
+        RestaurantPizza.query.filter_by(price=5).update({"price": 6})
+        db.session.commit()
+     summary = client.get("/analytics/prices").get_json()
+     assert (summary["count"], summary["min"], summary["max"]) == (5, "6.00", "20.00")
+
+     # An atomic batch sees its own uncommitted rows without sharing them,
+     # even once a rollback and a real insert bring the version back in step
+     form = {"price": "29", "pizza_name": "Pizza 2", "restaurant_name": "Restaurant 0"}
+     results = client.post("/batch", json={"atomic": True, "requests": [
+        {"method": "POST", "path": "/restaurantspizza", "form": form},
+        {"path": "/analytics/prices"},
+        {"path": "/missing"},
+     ]}).get_json()["responses"]
+     assert (results[1]["body"]["count"], results[1]["body"]["max"]) == (6, "29.00")
+     with app.app_context():
+        db.session.add(RestaurantPizza(restaurant_id=restaurant_ids[1], pizza_id=pizza_ids[2], price=8))
+        db.session.commit()
+     summary = client.get("/analytics/prices").get_json()
+     assert (summary["count"], summary["min"], summary["max"]) == (6, "6.00", "20.00")
+
+     assert client.get("/analytics/prices?group_by=city").status_code == 400
+     assert client.get("/analytics/prices?bins=0").status_code == 400
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_asgi_app_matches_wsgi(self, app):
+     pytest.importorskip("aiosqlite")
+     from server.asgi import AsgiApp
+
+     client = app.test_client(self)
+     with app.app_context():
+        restaurant = Restaurant(name="Pizza Inn", address="Moi Avenue")
+        pizzas = [Pizza(name=f"Pizza {i}", ingredients="Dough, Cheese") for i in range(3)]
+        db.session.add_all(RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10 + i) for i, pizza in enumerate(pizzas))
+        db.session.commit()
+        restaurant_id, pizza_ids = restaurant.id, [pizza.id for pizza in pizzas]
+
+     urls = [
+        "/",
+        "/restaurants",
+        "/restaurants?include=stats&limit=1",
+        f"/restaurants/{restaurant_id}",
+        f"/restaurants/{restaurant_id}?fields=id,pizzas",
+        "/restaurants/0",
+        "/pizzas?limit=2",
+        "/pizzas?ingredients=cheese&fields=id,name",
+        f"/pizzas/{pizza_ids[0]}",
+        "/restaurantspizza?sort=-price",
+        "/restaurantspizza?stream=true",
+        "/restaurantspizza?limit=0",
+        # No async handler: served by the Flask app on a thread
+        f"/restaurants/{restaurant_id}/stats",
+        "/missing",
+     ]
+     application = AsgiApp(app)
+
+     def run(*requests):
+        async def send_all():
+            await application.startup()
+            try:
+                return [await asgi_request(application, *request) for request in requests]
+            finally:
+                await application.shutdown()
+
+        return asyncio.run(send_all())
+
+     for url, (status, headers, body) in zip(urls, run(*[("GET", url) for url in urls])):
+        expected = client.get(url)
+        assert (status, body) == (expected.status_code, expected.data), url
+        assert headers.get("etag") == expected.headers.get("ETag"), url
+        assert "server-timing" in headers
+
+     etag = client.get("/restaurants").headers["ETag"]
+     form = b"price=40&pizza_name=Pizza 0&restaurant_name=Pizza Inn"
+     revalidated, invalid, deleted = run(
+        ("GET", "/restaurants", b"", [("If-None-Match", etag)]),
+        ("POST", "/restaurantspizza", form, [("Content-Type", "application/x-www-form-urlencoded")]),
+        ("DELETE", f"/pizzas/{pizza_ids[2]}"),
+     )
+     assert revalidated[0] == 304
+     # The price validation in server/models.py rejects it, as on the WSGI route
+     assert invalid[0] == 500 and b"Price must be between 1 and 30" in invalid[2]
+     assert deleted[0] == 200
+     assert client.get(f"/pizzas/{pizza_ids[2]}").get_json() == {}
+     assert [entry["pizza_id"] for entry in client.get("/restaurantspizza").get_json()] == pizza_ids[:2]
+
+    def test_asgi_app_runs_flask_hooks_and_error_handlers(self, tmp_path):
+     pytest.importorskip("aiosqlite")
+     from flask import abort, request
+     from server import create_app
+     from server.asgi import AsgiApp
+
+     other = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'hooks.db'}"})
+     with other.app_context():
+        db.create_all()
+
+     torn_down = []
+
+     @other.before_request
+     def guard():
+        if request.args.get("deny") == "forbidden":
+            abort(403)
+        if request.args.get("deny") == "crash":
+            raise RuntimeError("before_request failed")
+
+     @other.teardown_request
+     def teardown(error):
+        torn_down.append(request.args.get("deny"))
+
+     urls = ["/restaurants?deny=forbidden", "/restaurants?deny=crash", "/restaurants"]
+     application = AsgiApp(other)
+
+     async def send_all():
+        await application.startup()
+        try:
+            return [await asgi_request(application, "GET", url) for url in urls]
+        finally:
+            await application.shutdown()
+
+     # Errors raised by a hook come back as the WSGI app's responses, teardowns included
+     responses = asyncio.run(send_all())
+     assert torn_down == ["forbidden", "crash", None]
+     client = other.test_client()
+     for url, (status, headers, body) in zip(urls, responses):
+        expected = client.get(url)
+        assert (status, body) == (expected.status_code, expected.data), url
+     assert [status for status, _, _ in responses] == [403, 500, 200]
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_asgi_app_stops_streaming_to_disconnected_clients(self, app, monkeypatch):
+     pytest.importorskip("aiosqlite")
+     from server.asgi import AsgiApp
+
+     # One row per chunk, on the async streaming path and through the WSGI bridge
+     monkeypatch.setitem(app.config, "STREAMING_YIELD_PER", 1)
+     monkeypatch.setitem(app.config, "EXPORT_BATCH_SIZE", 1)
+     with app.app_context():
+        pizza = Pizza(name="Margherita", ingredients="Dough, Cheese")
+        restaurants = [Restaurant(name=f"Pizza Inn {i}", address="Moi Avenue") for i in range(40)]
+        db.session.add_all(RestaurantPizza(restaurant=restaurant, pizza=pizza, price=10) for restaurant in restaurants)
+        db.session.commit()
+
+     urls = ["/restaurantspizza?stream=true", "/export/restaurantspizza.ndjson"]
+     application = AsgiApp(app)
+
+     async def send_all():
+        await application.startup()
+        try:
+            return [await asgi_request(application, "GET", url, disconnect_after=3) for url in urls]
+        finally:
+            await application.shutdown()
+
+     client = app.test_client(self)
+     for url, (status, headers, body) in zip(urls, asyncio.run(send_all())):
+        full = client.get(url).data
+        assert status == 200
+        # The client left after three chunks, and the rows after them weren't sent
+        assert full.startswith(body) and len(body) < len(full) // 2, url
+
+    @pytest.mark.usefixtures("clean_db")
+    def test_asgi_app_decodes_non_ascii_requests(self, app):
+     pytest.importorskip("aiosqlite")
+     from flask import request
+     from server.asgi import AsgiApp, wsgi_environ
+
+     # ASGI paths are text, query strings stay percent-encoded and headers are latin-1 bytes
+     scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/pizzas/café",
+        "query_string": "q=jalape%C3%B1o&q=caf%C3%A9".encode(),
+        "headers": [(b"x-note", "crème".encode("latin-1")), (b"x-note", b"second")],
+        "http_version": "1.1",
+     }
+     with app.request_context(wsgi_environ(scope, b"")):
+        assert request.path == "/pizzas/café"
+        assert request.args.getlist("q") == ["jalapeño", "café"]
+        assert request.headers["X-Note"] == "crème,second"
+
+     with app.app_context():
+        db.session.add(Pizza(name="Jalapeño Crème", ingredients="Dough, Jalapeño"))
+        db.session.commit()
+
+     urls = [
+        # Async handlers
+        "/pizzas?ingredients=jalape%C3%B1o",
+        "/pizzas?ingredients=jalape%C3%B1o&stream=true",
+        # Through the WSGI bridge
+        "/pizzas/search?q=jalape%C3%B1o",
+        "/pizzas/café",
+     ]
+     application = AsgiApp(app)
+
+     async def send_all():
+        await application.startup()
+        try:
+            return [await asgi_request(application, "GET", url) for url in urls]
+        finally:
+            await application.shutdown()
+
+     client = app.test_client(self)
+     for url, (status, headers, body) in zip(urls, asyncio.run(send_all())):
+        expected = client.get(url)
+        assert (status, body) == (expected.status_code, expected.data), url
+     assert [pizza["name"] for pizza in client.get(urls[2]).get_json()["data"]] == ["Jalapeño Crème"]
+
+    def test_asgi_startup_builds_one_engine(self, app, monkeypatch):
+     pytest.importorskip("aiosqlite")
+     import server.asgi
+     from server.asgi import AsgiApp
+
+     engines = []
+
+     def create_engine(app):
+        engines.append(create_async_engine_for(app))
+        return engines[-1]
+
+     create_async_engine_for = server.asgi.create_async_engine_for
+     monkeypatch.setattr(server.asgi, "create_async_engine_for", create_engine)
+     application = AsgiApp(app)
+
+     # Concurrent first requests (or a request racing lifespan startup) share one engine
+     async def start_concurrently():
+        await asyncio.gather(*(application.startup() for _ in range(3)))
+        engine = application.engine
+        await application.shutdown()
+        return engine
+
+     assert asyncio.run(start_concurrently()) is engines[0]
+     assert len(engines) == 1
+     # A restart after shutdown, on a new event loop, builds a fresh engine
+     asyncio.run(start_concurrently())
+     assert len(engines) == 2
+
+    def test_create_app_gives_independent_apps(self, app, tmp_path):
+     from server import create_app
+
+     other = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'other.db'}",
+        "RESPONSE_CACHE_ENABLED": False,
+     })
+     with other.app_context():
+        db.create_all()
+        db.session.add(Restaurant(name="Other Inn", address="Kimathi Street"))
+        db.session.commit()
+
+     assert [r["name"] for r in other.test_client().get("/restaurants").get_json()] == ["Other Inn"]
+     assert app.test_client().get("/restaurants").get_json() == []
+     assert other.extensions["response_cache"] is not app.extensions["response_cache"]
+
+    def test_import_time_budget(self):
+     # Creating the app must not pull in the migration machinery or the
+     # optional dependencies, and the repo's own modules must stay cheap
+     result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from server import create_app; create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+     )
+     assert result.returncode == 0, result.stderr
+
+     own_us, imported = 0, set()
+     for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            self_us, _, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            imported.add(name)
+            if name == "server" or name.startswith("server."):
+                own_us += int(self_us)
+
+     assert "server.routes" in imported
+     for lazy in ("alembic", "flask_migrate", "numpy", "faker", "aiosqlite", "uvicorn"):
+        assert lazy not in imported, lazy
+     assert own_us < IMPORT_BUDGET_US, f"server modules took {own_us / 1000:.0f} ms to import"
@@ -0,0 +1,6 @@
+# Production WSGI entry point: gunicorn (settings in gunicorn.conf.py)
+
+from server import create_app
+
+# gunicorn and other WSGI servers look for "application" by default
+application = create_app()